@@ -18,16 +18,49 @@ Inputs:
     - outcome_gwas.csv  : Outcome GWAS summary statistics
     - output_dir        : Directory to save output files
     - log10_flag        : "y" if p-values are already -log10(p), else "n"
+
+Parsed GWAS are not cached by default. Set MRCOPE_GWAS_CACHE_DIR to a directory
+that outlives the run (not the Nextflow work dir) to keep a Parquet copy of each
+parsed input there; later runs on the same, unchanged file load it instead.
 """
 
 import os
 import sys
+import json
+import hashlib
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # files only; never pay for an interactive backend
 import matplotlib.pyplot as plt
-from scipy.stats import norm
+from matplotlib.colors import to_rgba_array
+from scipy import special
 from scipy import stats
 
+# Optional, for lazy CSV scanning with projection pushdown
+try:
+    import polars as pl
+    _HAS_POLARS = True
+except Exception:
+    _HAS_POLARS = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
+# Optional, for the fused SE and Q-Q kernels
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except Exception:
+    _HAS_NUMBA = False
+
 # ----------------- Auto Column Mapping ----------------- #
 
 AUTO_COLUMN_MAP = {
@@ -38,22 +71,67 @@ AUTO_COLUMN_MAP = {
     'A2': ['a2', 'other_allele', 'oa', 'ref'],
     'BETA': ['beta', 'effect_size', 'b'],
     'SE': ['se', 'stderr', 'standard_error'],
-    'PVALUE': ['pval', 'p_value', 'p', 'pvalue'],  
+    'PVALUE': ['pval', 'p_value', 'p', 'pvalue'],
     'EAF': ['eaf', 'effect_allele_freq', 'freq', 'riskfrequency', 'maf']
 }
 
-def auto_map_columns(df, label):
-    mapping = {}
-    df_cols_lower = [c.lower() for c in df.columns]
+# alias -> (standard name, priority within its alias list)
+REVERSE_MAP = {
+    alias: (std, rank)
+    for std, aliases in AUTO_COLUMN_MAP.items()
+    for rank, alias in enumerate(aliases)
+}
+
+# Manhattan: every SNP with p < MANHATTAN_KEEP_P is drawn; the null band
+# above it is randomly thinned to at most MANHATTAN_NULL_SAMPLE points
+MANHATTAN_KEEP_P = 1e-5
+MANHATTAN_NULL_SAMPLE = 50_000
+
+# The Q-Q confidence band is evaluated at this many log-spaced ranks
+QQ_CI_POINTS = 2000
+
+# Q-Q scatter: every one of the QQ_TOP_POINTS most significant SNPs is drawn,
+# plus QQ_REST_POINTS log-spaced ranks from the (visually solid) remainder
+QQ_TOP_POINTS = 5000
+QQ_REST_POINTS = 5000
+
+# Median of the 1-df chi-square, the lambda_GC denominator
+CHI2_1_MEDIAN = stats.chi2.ppf(0.5, df=1)
+
+# Opt-in cache of parsed GWAS, one file per resolved input
+CACHE_DIR = os.environ.get("MRCOPE_GWAS_CACHE_DIR", "").strip() or None
+CACHE_SUFFIX = ".mrcope.parquet"
+# Bump whenever parse_gwas changes the columns or dtypes it returns
+CACHE_VERSION = 5
+CACHE_META_KEY = b"mrcope"
+
+# Columns kept after loading — A1/A2/EAF are never used by the QC or plots
+LOAD_COLUMNS = ['SNP', 'CHR', 'BP', 'BETA', 'SE', 'PVALUE']
+
+# Custom layout: riskAllele "rs123-A" and locations "CHR:BP"
+RISK_ALLELE_RE = r"^(?P<SNP>[^-]+)"
+LOCATION_RE = r"^(?P<CHR>[^:]+):\D*(?P<BP>\d+)"
+
+@functools.lru_cache(maxsize=32)
+def _resolve_mapping(columns):
+    """Standard name -> original column for one header layout (a tuple)."""
+    found = {}
+    for col in columns:
+        hit = REVERSE_MAP.get(col.lower())
+        if hit is None:
+            continue
+        std, rank = hit
+        # Earlier aliases win; on ties the first matching column is kept
+        if std not in found or rank < found[std][0]:
+            found[std] = (rank, col)
+    return {std: found[std][1] for std in AUTO_COLUMN_MAP if std in found}
+
+def auto_map_columns(columns, label):
+    mapping = dict(_resolve_mapping(tuple(columns)))
 
     print(f"🔎 Auto-mapping columns for {label} GWAS...")
 
-    for standard_name, possible_names in AUTO_COLUMN_MAP.items():
-        for possible in possible_names:
-            if possible in df_cols_lower:
-                matched_col = df.columns[df_cols_lower.index(possible)]
-                mapping[standard_name] = matched_col
-                break
+    for standard_name in AUTO_COLUMN_MAP:
         if standard_name not in mapping:
             print(f"⚠️ WARNING: Column for {standard_name} not found in {label} GWAS")
 
@@ -64,32 +142,73 @@ def auto_map_columns(df, label):
 
 def parse_custom_gwas(df, label):
     print(f"⚙️ Parsing custom GWAS structure for {label}...")
-    df["SNP"] = df["riskAllele"].str.split("-").str[0]
-    df["CHR"] = df["locations"].str.split(":").str[0]
-    raw_bp = df["locations"].str.split(":").str[1]
-
-    if raw_bp.str.contains(r"\D", regex=True).any():
-        print("🧹 Detected non-numeric BP values — extracting digits...")
-        df["BP"] = raw_bp.str.extract(r"(\d+)")[0]
+    location = df["LOCATIONS"].str.extract(LOCATION_RE)
+    df["SNP"] = df["RISKALLELE"].str.extract(RISK_ALLELE_RE, expand=False)
+    df["CHR"] = location["CHR"]
+    # The BP group only matches digits, so a complete column casts directly
+    if location["BP"].notna().all():
+        df["BP"] = location["BP"].astype(np.int64)
     else:
-        df["BP"] = raw_bp
-
-    df["BP"] = pd.to_numeric(df["BP"], errors='coerce')
-    df["PVALUE"] = pd.to_numeric(df["pValue"], errors='coerce')
+        df["BP"] = pd.to_numeric(location["BP"], errors='coerce', downcast="integer")
+    df["PVALUE"] = pd.to_numeric(df["PVALUE"], errors='coerce')
     df.dropna(subset=["SNP", "CHR", "BP", "PVALUE"], inplace=True)
     df["CHR"] = df["CHR"].astype(str)
-    df["BP"] = df["BP"].astype(int)
+    df["BP"] = df["BP"].astype("int32")
     print(f"✅ Custom parsing complete for {label}.\n")
     return df
 
-def load_gwas(path, label):
-    print(f"📅 Loading {label} GWAS: {path}")
-    sep = "\t" if path.endswith((".tsv", ".txt")) else ","
-    df = pd.read_csv(path, sep=sep)
+def scan_gwas(path, sep, label):
+    """Lazily read only the columns used downstream, then collect to pandas."""
+    lf = pl.scan_csv(path, separator=sep, infer_schema=False)
+    raw_cols = lf.collect_schema().names()
+    columns = [c.strip().upper() for c in raw_cols]
+    lf = lf.rename(dict(zip(raw_cols, columns)))
+
+    mapping = auto_map_columns(columns, label)
+
+    def num(std_col, dtype=pl.Float64):
+        return pl.col(mapping[std_col]).cast(dtype, strict=False).alias(std_col)
+
+    if not all(k in mapping for k in ["SNP", "CHR", "BP", "PVALUE"]):
+        if {"RISKALLELE", "LOCATIONS", "PVALUE"}.issubset(columns):
+            print(f"⚙️ Parsing custom GWAS structure for {label}...")
+            locations = pl.col("LOCATIONS").str.split(":")
+            exprs = [
+                pl.col("RISKALLELE").str.split("-").list.get(0).alias("SNP"),
+                locations.list.get(0).alias("CHR"),
+                locations.list.get(1, null_on_oob=True).str.extract(r"(\d+)")
+                         .cast(pl.Int64, strict=False).alias("BP"),
+                pl.col("PVALUE").cast(pl.Float64, strict=False),
+            ]
+            exprs += [num(c) for c in ["BETA", "SE"] if c in mapping]
+            lf = lf.select(exprs).drop_nulls(subset=["SNP", "CHR", "BP", "PVALUE"])
+        else:
+            print(f"❌ ERROR: Missing critical columns in {label} GWAS and no fallback possible.")
+            sys.exit(1)
+    else:
+        exprs = [
+            pl.col(mapping["SNP"]).alias("SNP"),
+            pl.col(mapping["CHR"]).alias("CHR"),
+            # Float64, not Int64: pandas writes BP with gaps as "46298401.0",
+            # and parse_gwas narrows whole positions back to integers
+            num("BP"),
+        ]
+        exprs += [num(c) for c in ["BETA", "SE", "PVALUE"] if c in mapping]
+        lf = lf.select(exprs)
+
+    df = lf.collect(engine="streaming").to_pandas()
+    print(f"✅ Loaded {label} GWAS | Shape: {df.shape}\n")
+    return df
+
+def read_gwas(path, sep, label):
+    if _HAS_PYARROW:
+        df = pd.read_csv(path, sep=sep, engine="pyarrow", dtype_backend="pyarrow")
+    else:
+        df = pd.read_csv(path, sep=sep)
     df.columns = df.columns.str.strip().str.upper()
     print(f"✅ Loaded {label} GWAS | Shape: {df.shape}\n")
 
-    mapping = auto_map_columns(df, label)
+    mapping = auto_map_columns(list(df.columns), label)
 
     if not all(k in mapping for k in ["SNP", "CHR", "BP", "PVALUE"]):
         if {"RISKALLELE", "LOCATIONS", "PVALUE"}.issubset(df.columns):
@@ -102,6 +221,110 @@ def load_gwas(path, label):
             if std_col != actual_col:
                 df.rename(columns={actual_col: std_col}, inplace=True)
 
+    return df[[c for c in LOAD_COLUMNS if c in df.columns]]
+
+def gwas_sep(path):
+    return "\t" if path.endswith((".tsv", ".txt")) else ","
+
+def gwas_cache_path(path, cache_dir):
+    src = os.path.realpath(path)
+    tag = hashlib.sha1(src.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(src)}.{tag}{CACHE_SUFFIX}")
+
+def source_stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def read_cache_meta(path, cache_dir):
+    """Metadata of a cache that is valid for `path` (same version and source file), else None."""
+    cache = gwas_cache_path(path, cache_dir)
+    if not _HAS_PYARROW or not os.path.isfile(cache):
+        return None
+    try:
+        meta = json.loads(pq.read_schema(cache).metadata[CACHE_META_KEY])
+    except Exception:
+        return None
+    if meta.get("version") != CACHE_VERSION or meta.get("source") != source_stamp(path):
+        return None
+    return meta
+
+def read_gwas_cache(path, cache_dir, label):
+    cache = gwas_cache_path(path, cache_dir)
+    try:
+        df = pd.read_parquet(cache)
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable GWAS cache {cache}: {e}")
+        return None
+    print(f"⚡ Loaded {label} GWAS from cache: {cache} | Shape: {df.shape}\n")
+    return df
+
+def write_gwas_cache(df, path, cache_dir, stamp, qc):
+    if not _HAS_PYARROW:
+        return
+    cache = gwas_cache_path(path, cache_dir)
+    tmp = f"{cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = {"version": CACHE_VERSION, "source": stamp, "qc": qc}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               CACHE_META_KEY: json.dumps(meta)})
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, cache)  # readers never see a half-written cache
+        print(f"💾 Cached parsed GWAS: {cache}\n")
+    except Exception as e:
+        print(f"⚠️ Could not write GWAS cache {cache}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load_gwas(path, label, cache_dir):
+    """Parsed GWAS and its QC summary; a valid cache carries both, so a hit skips the parse."""
+    print(f"📅 Loading {label} GWAS: {path}")
+    meta = read_cache_meta(path, cache_dir) if cache_dir else None
+    df = read_gwas_cache(path, cache_dir, label) if meta else None
+    if df is not None:
+        return df, meta["qc"]
+    stamp = source_stamp(path)
+    df, qc = parse_gwas(path, label)
+    if cache_dir:
+        write_gwas_cache(df, path, cache_dir, stamp, qc)
+    return df, qc
+
+def neg_log10_p(df, is_log10_input=False):
+    """-log10(p) as a plain array for the Manhattan plot (honours the log10 input flag)."""
+    pvals = df["PVALUE"].to_numpy(dtype=np.float64, na_value=np.nan)
+    if is_log10_input:
+        return pvals
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -np.log10(pvals)
+
+if _HAS_NUMBA:
+    # Serial on purpose: parse_gwas runs in two threads at once, and numba's
+    # default threading layer cannot host concurrent parallel launches.
+    # No fastmath either: the isfinite test must see the infinities ndtri returns.
+    @njit(cache=True, error_model="numpy")
+    def _se_from_z(beta, z):
+        """|beta| / |z| in one pass; NaN where z is infinite (p == 0)."""
+        se = np.empty(len(beta))
+        for i in range(len(beta)):
+            zi = abs(z[i])
+            se[i] = abs(beta[i]) / zi if np.isfinite(zi) else np.nan
+        return se
+else:
+    def _se_from_z(beta, z):
+        """|beta| / |z|; NaN where z is infinite (p == 0)."""
+        z = np.abs(z)
+        z[~np.isfinite(z)] = np.nan
+        with np.errstate(divide="ignore"):
+            return np.abs(beta) / z
+
+def parse_gwas(path, label):
+    sep = gwas_sep(path)
+    if _HAS_POLARS:
+        df = scan_gwas(path, sep, label)
+    else:
+        df = read_gwas(path, sep, label)
+    qc = qc_summary(df)
+
     # --- Ensure numeric types ---
     if "BETA" in df.columns:
         df["BETA"] = pd.to_numeric(df["BETA"], errors="coerce")
@@ -112,63 +335,103 @@ def load_gwas(path, label):
     if "SE" not in df.columns:
         if "BETA" in df.columns and "PVALUE" in df.columns:
             print(f"🧠 Inferring SE for {label} from BETA and PVALUE...")
-            z_scores = norm.ppf(1 - df["PVALUE"] / 2)
-            df["SE"] = df["BETA"].abs() / z_scores.replace([np.inf, np.nan], np.nan)
+            # |Z| = isf(p/2) via ndtri(p/2): no 1 - p/2 cancellation for tiny p
+            z_scores = special.ndtri(df["PVALUE"].to_numpy(dtype=np.float64) / 2)
+            df["SE"] = _se_from_z(df["BETA"].to_numpy(dtype=np.float64), z_scores)
             print(f"✅ SE calculated for {df['SE'].notna().sum()} SNPs.")
         else:
             print(f"⚠️ Cannot infer SE for {label}: missing BETA or PVALUE columns.")
 
     df.dropna(subset=["SNP", "BETA", "PVALUE"], inplace=True)
-    return df
 
-def qc_report(df, label):
+    # --- Compact dtypes: ~25 chromosome labels, positions < 2^32 ---
+    # "string", not str: a missing CHR stays NA (code -1) instead of becoming a "nan" label
+    df["CHR"] = df["CHR"].astype("string").astype("category")
+    df["BP"] = pd.to_numeric(df["BP"], downcast="unsigned")
+    # BETA/SE are not plotted, so float32 is plenty; PVALUE stays float64
+    # because float32 underflows below ~1e-38 and would flatten the top hits
+    for col in ("BETA", "SE"):
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+    return df, qc
+
+def qc_summary(df):
+    """QC summary of the loaded columns, taken before type coercion and the dropna."""
+    # Plain types so the summary can be stored in the cache metadata
+    return {
+        "rows": len(df),
+        "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        "missing": {str(c): int(v) for c, v in df.isna().sum().items()},
+    }
+
+def print_qc_summary(qc, label):
     print(f"🔎 QC Summary: {label} GWAS")
     print("-" * 40)
-    print(df.info())
+    print(f"Rows: {qc['rows']} | Columns: {len(qc['missing'])}")
+    print("\nColumn dtypes:")
+    print(pd.Series(qc["dtypes"], dtype=object))
     print("\nMissing values per column:")
-    print(df.isna().sum())
+    print(pd.Series(qc["missing"], dtype="int64"))
     print("\n")
 
-def manhattan_plot(df, output_path, title, is_log10_input=False):
+def manhattan_plot(df, neg_log_p, output_path, title):
     if "PVALUE" not in df.columns:
         print(f"❌ Cannot plot Manhattan — PVALUE column missing in {title}.")
         return
 
-    df = df.dropna(subset=["CHR", "BP", "PVALUE"])
-    df = df[df["PVALUE"] > 0]
-
-    if not is_log10_input:
-        df["-log10(PVALUE)"] = -np.log10(df["PVALUE"])
-    else:
-        df["-log10(PVALUE)"] = df["PVALUE"]
-
-    df["CHR"] = df["CHR"].astype(str)
-    df = df.sort_values(["CHR", "BP"])
-    df["ind"] = range(len(df))
-    df_grouped = df.groupby("CHR")
+    # Sort an indexer over the three plotted columns instead of the whole frame
+    chrom = df["CHR"].astype("category")
+    codes = chrom.cat.codes.to_numpy()
+    bp = df["BP"].to_numpy(dtype=np.float64, na_value=np.nan)
+    pvals = df["PVALUE"].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = np.flatnonzero((codes >= 0) & ~np.isnan(bp) & (pvals > 0))
+    if valid.size == 0:
+        print(f"⚠️ No SNPs with a chromosome, position and p-value in {title} — skipping Manhattan plot.\n")
+        return
+    order = valid[np.lexsort((bp[valid], codes[valid]))]
+
+    chr_sorted = codes[order]
+    neg_log_p = neg_log_p[order]
+    n_snps = len(order)
+    ind = np.arange(n_snps)
+
+    # Rows are sorted by CHR, so each chromosome is one contiguous block;
+    # its start is wherever the code changes (codes are >= 0, hence prepend=-1)
+    starts = np.flatnonzero(np.diff(chr_sorted, prepend=-1))
+    chrom_codes = chr_sorted[starts]
+    bounds = np.append(starts, n_snps)
+    x_labels = list(chrom.cat.categories[chrom_codes])
+    x_labels_pos = (bounds[:-1] + bounds[1:] - 1) / 2
+    alternate = np.repeat(np.arange(len(chrom_codes)) % 2, np.diff(bounds))
+
+    # Thin the indistinguishable null band; positions still use every SNP
+    plotted = neg_log_p > -np.log10(MANHATTAN_KEEP_P)
+    null_rows = np.flatnonzero(~plotted)
+    n_null = len(null_rows)
+    if n_null > MANHATTAN_NULL_SAMPLE:
+        rng = np.random.default_rng(0)
+        null_rows = rng.choice(null_rows, MANHATTAN_NULL_SAMPLE, replace=False)
+    plotted[null_rows] = True
 
     fig, ax = plt.subplots(figsize=(12, 6), dpi=300)
-    colors = ["#4C72B0", "#55A868"]
-    x_labels, x_labels_pos = [], []
-
-    for i, (chrom, group) in enumerate(df_grouped):
-        ax.scatter(
-            group["ind"], group["-log10(PVALUE)"],
-            color=colors[i % 2],
-            s=6, alpha=0.8, edgecolor='none'
-        )
-        mid_pos = (group["ind"].min() + group["ind"].max()) / 2
-        x_labels.append(chrom)
-        x_labels_pos.append(mid_pos)
+    colors = to_rgba_array(["#4C72B0", "#55A868"])
+
+    # One collection for all chromosomes, coloured by alternating block
+    shown = np.flatnonzero(plotted)
+    ax.scatter(
+        ind[shown], neg_log_p[shown],
+        c=colors[alternate[shown]],
+        s=6, alpha=0.8, edgecolor='none', rasterized=True
+    )
 
     ax.axhline(y=-np.log10(5e-8), color='red', linestyle='--', linewidth=1)
     ax.axhline(y=-np.log10(1e-5), color='orange', linestyle='--', linewidth=1)
 
-    ymax = df["-log10(PVALUE)"].max()
+    ymax = neg_log_p.max()
     ax.set_ylim([0, ymax + 0.1 * ymax])
     ax.set_xticks(x_labels_pos)
     ax.set_xticklabels(x_labels, fontsize=6)
-    ax.set_xlim([0, len(df)])
+    ax.set_xlim([0, n_snps])
     ax.set_xlabel("Chromosome", fontsize=10)
     ax.set_ylabel("-log10(p)", fontsize=10)
     ax.set_title(title, fontsize=12, weight='bold', pad=15)
@@ -178,35 +441,84 @@ def manhattan_plot(df, output_path, title, is_log10_input=False):
     ax.tick_params(axis='x', labelsize=6)
     ax.legend().set_visible(False)
 
+    if n_null > MANHATTAN_NULL_SAMPLE:
+        ax.text(0.99, 0.98,
+                f"p ≥ {MANHATTAN_KEEP_P:g}: random {MANHATTAN_NULL_SAMPLE:,} of {n_null:,} SNPs shown",
+                transform=ax.transAxes, ha="right", va="top", fontsize=6, color="gray")
+
     plt.tight_layout()
     plt.savefig(output_path, dpi=300)
     plt.close()
     print(f"✅ Manhattan plot saved: {output_path}\n")
 
+if _HAS_NUMBA:
+    # No fastmath: the min/max clamp is only defined for infinities (p == 0) without it
+    @njit(parallel=True, cache=True)
+    def _qq_transform(sorted_neg_log_p, n):
+        """Observed (descending, clipped to [0, 300]) and expected -log10(p) in one pass."""
+        observed = np.empty(n)
+        expected = np.empty(n)
+        lo = 1.0 / (n + 1)
+        step = (1.0 - lo) / (n - 1) if n > 1 else 0.0
+        for i in prange(n):
+            observed[i] = min(max(sorted_neg_log_p[n - 1 - i], 0.0), 300.0)
+            expected[i] = -np.log10(lo + i * step)
+        return observed, expected
+else:
+    def _qq_transform(sorted_neg_log_p, n):
+        """Observed (descending, clipped to [0, 300]) and expected -log10(p)."""
+        observed = np.clip(sorted_neg_log_p[::-1], 0.0, 300.0)
+        expected = -np.log10(np.linspace(1 / (n + 1), 1, n))
+        return observed, expected
+
 def qq_plot(df, output_path, title):
     if "PVALUE" not in df.columns:
         print(f"❌ Cannot plot Q-Q — PVALUE column missing in {title}.")
         return
 
-    pvals = df["PVALUE"].dropna()
-    pvals = np.clip(pvals, 1e-300, 1.0)
+    pvals = df["PVALUE"].to_numpy(dtype=np.float64, na_value=np.nan)
+    pvals = np.clip(pvals[~np.isnan(pvals)], 1e-300, 1.0)
     n = len(pvals)
-    expected = -np.log10(np.linspace(1 / (n + 1), 1, n))
-    observed = -np.log10(np.sort(pvals))
-
-    quantiles = np.arange(1, n + 1) / (n + 1)
+    if n == 0:
+        print(f"⚠️ No p-values to plot in {title} — skipping Q-Q plot.\n")
+        return
+    # Observed values come from the same clipped p as n: zero, negative and
+    # > 1 p-values stay in the plot, at 300 and 0
+    neg_log_p = -np.log10(pvals)
+    neg_log_p.sort()
+    observed, expected = _qq_transform(neg_log_p, n)
+
+    # beta.ppf is a root find per point; evaluate the CI band on log-spaced
+    # ranks only (even spacing along the log-scale x axis) and draw through them
+    if n > QQ_CI_POINTS:
+        ci_idx = np.unique(np.geomspace(1, n, QQ_CI_POINTS).round().astype(np.int64)) - 1
+    else:
+        ci_idx = np.arange(n)
+    quantiles = (ci_idx + 1) / (n + 1)
     ci_low = -np.log10(stats.beta.ppf(0.025, quantiles * n, (1 - quantiles) * n))
     ci_high = -np.log10(stats.beta.ppf(0.975, quantiles * n, (1 - quantiles) * n))
 
-    chisq = stats.chi2.isf(pvals, df=1)
-    lambda_gc = np.median(chisq) / stats.chi2.ppf(0.5, df=1)
+    # chi2(1).isf(p) == ndtri(p/2)**2 and is monotone in p, so the median
+    # chi-square only needs the middle one or two p-values, not all N
+    mid = [(n - 1) // 2, n // 2]
+    p_mid = np.partition(pvals, mid)[mid]
+    lambda_gc = np.mean(special.ndtri(p_mid / 2) ** 2) / CHI2_1_MEDIAN
+
+    # The sort above (fast in NumPy) stays full-length so ranks are exact;
+    # only the drawn points are thinned
+    if n > QQ_TOP_POINTS + QQ_REST_POINTS:
+        rest = np.geomspace(QQ_TOP_POINTS + 1, n, QQ_REST_POINTS).round().astype(np.int64) - 1
+        shown = np.unique(np.concatenate([np.arange(QQ_TOP_POINTS), rest]))
+    else:
+        shown = np.arange(n)
 
     cmap = plt.cm.viridis_r
-    colors = cmap(np.linspace(0.1, 0.85, n))
+    colors = cmap(np.linspace(0.1, 0.85, n)[shown])
 
     plt.figure(figsize=(7.5, 7.5), dpi=400)
-    plt.fill_between(expected, ci_low, ci_high, color="#EAEAF2", alpha=0.6, label="95% CI")
-    plt.scatter(expected, observed, c=colors, s=10, edgecolor='none', alpha=0.8)
+    plt.fill_between(expected[ci_idx], ci_low, ci_high, color="#EAEAF2", alpha=0.6, label="95% CI",
+                     rasterized=True)
+    plt.scatter(expected[shown], observed[shown], c=colors, s=10, edgecolor='none', alpha=0.8, rasterized=True)
     plt.plot([0, max(expected)], [0, max(expected)], linestyle="--", color="black", linewidth=1.3)
 
     plt.xlabel(r"Expected $-\log_{10}$(P)", fontsize=13, weight="bold")
@@ -251,16 +563,24 @@ def main():
     print("=" * 60 + "\n")
 
     validate_inputs(exposure_path, outcome_path, output_dir)
+    if CACHE_DIR:
+        os.makedirs(CACHE_DIR, exist_ok=True)
 
-    exposure = load_gwas(exposure_path, "Exposure")
-    outcome = load_gwas(outcome_path, "Outcome")
+    # Independent parses; the CSV readers release the GIL so the two overlap.
+    # Plots stay serial below — pyplot's current-figure state is not thread-safe.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_exp = ex.submit(load_gwas, exposure_path, "Exposure", CACHE_DIR)
+        f_out = ex.submit(load_gwas, outcome_path, "Outcome", CACHE_DIR)
+        (exposure, exposure_qc), (outcome, outcome_qc) = f_exp.result(), f_out.result()
 
-    qc_report(exposure, "Exposure")
-    qc_report(outcome, "Outcome")
+    print_qc_summary(exposure_qc, "Exposure")
+    print_qc_summary(outcome_qc, "Outcome")
+    exposure_mlog = neg_log10_p(exposure, is_log10_input)
+    outcome_mlog = neg_log10_p(outcome, is_log10_input)
 
     print("📊 Generating Manhattan and Q-Q plots...\n")
-    manhattan_plot(exposure, os.path.join(output_dir, "exposure_manhattan.png"), "Exposure GWAS Manhattan Plot", is_log10_input)
-    manhattan_plot(outcome, os.path.join(output_dir, "outcome_manhattan.png"), "Outcome GWAS Manhattan Plot", is_log10_input)
+    manhattan_plot(exposure, exposure_mlog, os.path.join(output_dir, "exposure_manhattan.png"), "Exposure GWAS Manhattan Plot")
+    manhattan_plot(outcome, outcome_mlog, os.path.join(output_dir, "outcome_manhattan.png"), "Outcome GWAS Manhattan Plot")
 
     qq_plot(exposure, os.path.join(output_dir, "exposure_qq.png"), "Exposure GWAS Q-Q Plot")
     qq_plot(outcome, os.path.join(output_dir, "outcome_qq.png"), "Outcome GWAS Q-Q Plot")
@@ -16,13 +16,31 @@ Description:
 
 Usage:
     python3 02_gwas_preprocessing.py <exposure_gwas.csv> <outcome_gwas.csv> <output_filtered.csv>
+
+    An output path ending in .parquet writes zstd-compressed Parquet instead (needs pyarrow).
 """
 
 import sys
 import os
+import numpy as np
 import pandas as pd
 from scipy.stats import norm
 
+# Optional, for a lazy scan -> filter -> join plan
+try:
+    import polars as pl
+    _HAS_POLARS = True
+except Exception:
+    _HAS_POLARS = False
+
+# Optional, multi-threaded CSV parsing
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
 # ----------------- Auto Column Mapping ----------------- #
 
 AUTO_COLUMN_MAP = {
@@ -37,6 +55,23 @@ AUTO_COLUMN_MAP = {
     'EAF': ['eaf', 'effect_allele_freq', 'freq', 'riskfrequency', 'maf']
 }
 
+# Custom GWAS Catalog layout: "rs123-A" and "7:46298401"
+RISK_ALLELE_RE = r"^(?P<SNP>[^-]+)"
+LOCATION_RE = r"^(?P<CHR>[^:]+):\D*(?P<BP>\d+)"
+
+# Single-nucleotide alleles; anything else (INDELs, multi-base) is dropped
+_ALLELES = frozenset("ATCG")
+
+# Columns a SNP must have to be harmonised; CHR, BP and EAF are carried along even when missing
+REQUIRED_COLUMNS = ["SNP", "A1", "A2", "BETA", "SE", "PVALUE"]
+
+# pandas' default NA strings, so every reader drops the same cells as read_csv
+NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+]
+
 def print_header():
     print("\n" + "=" * 60)
     print("MR-CoPe | GWAS Harmonisation & F-Statistic Filtering")
@@ -48,17 +83,17 @@ def validate_inputs(paths, labels):
             print(f"❌ ERROR: {label} file not found at: {path}")
             sys.exit(1)
 
-def auto_map_columns(df, label):
+def auto_map_columns(columns, label):
     mapping = {}
-    df_cols_lower = [c.lower() for c in df.columns]
+    # Built in reverse so the first column wins when two differ only in case
+    lower_to_orig = {c.lower(): c for c in reversed(list(columns))}
 
     print(f"🔎 Auto-mapping columns for {label} GWAS...")
 
     for standard_name, possible_names in AUTO_COLUMN_MAP.items():
         for possible in possible_names:
-            if possible in df_cols_lower:
-                matched_col = df.columns[df_cols_lower.index(possible)]
-                mapping[standard_name] = matched_col
+            if possible in lower_to_orig:
+                mapping[standard_name] = lower_to_orig[possible]
                 break
         if standard_name not in mapping:
             print(f"⚠️ WARNING: Column for {standard_name} not found in {label} GWAS")
@@ -70,17 +105,10 @@ def auto_map_columns(df, label):
 
 def parse_custom_gwas(df, label):
     print(f"⚙️ Parsing custom GWAS structure for {label}...")
-    df["SNP"] = df["riskAllele"].str.split("-").str[0]
-    df["CHR"] = df["locations"].str.split(":").str[0]
-    raw_bp = df["locations"].str.split(":").str[1]
-
-    if raw_bp.str.contains(r"\D", regex=True).any():
-        print("🧹 Detected non-numeric BP values — extracting digits...")
-        df["BP"] = raw_bp.str.extract(r"(\d+)")[0]
-    else:
-        df["BP"] = raw_bp
-
-    df["BP"] = pd.to_numeric(df["BP"], errors='coerce')
+    location = df["locations"].str.extract(LOCATION_RE)
+    df["SNP"] = df["riskAllele"].str.extract(RISK_ALLELE_RE, expand=False)
+    df["CHR"] = location["CHR"]
+    df["BP"] = pd.to_numeric(location["BP"], errors='coerce')
     df["PVALUE"] = pd.to_numeric(df["pValue"], errors='coerce')
     df.dropna(subset=["SNP", "CHR", "BP", "PVALUE"], inplace=True)
     df["CHR"] = df["CHR"].astype(str)
@@ -88,47 +116,97 @@ def parse_custom_gwas(df, label):
     print(f"✅ Custom parsing complete for {label}.\n")
     return df
 
-def is_snp_allele(a):
-    return a in {"A", "T", "C", "G"}
+def abs_z_from_p(pvals):
+    # Clip so p == 0 maps to a large finite |Z| rather than ppf(0) = -inf
+    pvals = np.clip(pvals, 1e-300, 1.0)
+    return np.abs(norm.ppf(pvals * 0.5))
 
 def infer_se_if_missing(df):
     if "SE" not in df.columns and "BETA" in df.columns and "PVALUE" in df.columns:
         print("🧠 Inferring SE from BETA and PVALUE...")
-        df["SE"] = abs(df["BETA"] / norm.ppf(df["PVALUE"] / 2))
-        df["SE"] = pd.to_numeric(df["SE"], errors="coerce")
+        beta = df["BETA"].to_numpy(dtype=np.float64, na_value=np.nan)
+        pvals = df["PVALUE"].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df["SE"] = np.abs(beta) / abs_z_from_p(pvals)
+    return df
+
+def gwas_sep(path):
+    return "\t" if path.endswith((".tsv", ".txt")) else ","
+
+ENSEMBL_COLUMNS = {
+    "rsids": "SNP",
+    "beta": "BETA",
+    "pval": "PVALUE",
+    "alt": "A1",
+    "ref": "A2",
+    "maf": "EAF"
+}
+
+def plan_columns(columns, label):
+    """Pick the GWAS layout and the columns it needs from the header alone."""
+    if {"rsids", "beta", "pval", "alt", "ref"}.issubset(columns):
+        print("🔄 Detected ENSEMBL-style GWAS — remapping columns...")
+        return "ensembl", None, [c for c in ENSEMBL_COLUMNS if c in columns]
+
+    mapping = auto_map_columns(columns, label)
+    needed = set(mapping.values())
+    if all(k in mapping for k in ["SNP", "CHR", "BP", "PVALUE"]):
+        layout = "standard"
+    elif {"riskAllele", "locations", "pValue"}.issubset(columns):
+        layout = "custom"
+        needed |= {"riskAllele", "locations", "pValue"}
+    else:
+        print(f"❌ ERROR: Missing critical columns in {label} GWAS and no fallback possible.")
+        sys.exit(1)
+    return layout, mapping, [c for c in columns if c in needed]
+
+def read_csv_arrow(path, sep, usecols, text_cols):
+    """pyarrow read of `usecols` with `text_cols` typed as strings at parse time.
+
+    pd.read_csv(engine="pyarrow", dtype=str) casts after inference, turning a CHR column
+    with gaps into "1.0" / "nan" text; typing the column in the reader keeps "1" and a real NA.
+    """
+    table = pa_csv.read_csv(
+        path,
+        parse_options=pa_csv.ParseOptions(delimiter=sep),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=usecols,
+            column_types={c: pa.string() for c in text_cols},
+            null_values=NA_STRINGS,
+            strings_can_be_null=True,
+        ),
+    )
+    df = table.to_pandas()
+    # Missing text cells come back as None; keep the C parser's NaN
+    obj = df.columns[df.dtypes == object]
+    df[obj] = df[obj].where(df[obj].notna(), np.nan)
     return df
 
 def load_gwas(path, label):
     print(f"📥 Loading {label} GWAS: {path}")
-    sep = "\t" if path.endswith((".tsv", ".txt")) else ","
-    df = pd.read_csv(path, sep=sep)
+    sep = gwas_sep(path)
+
+    # Peek at the header, then parse only the columns the pipeline uses
+    raw_cols = pd.read_csv(path, sep=sep, nrows=0).columns
+    raw_of = dict(zip(raw_cols.str.strip(), raw_cols))
+    layout, mapping, keep = plan_columns(list(raw_of), label)
+
+    # Identifiers stay text even when they look numeric (CHR 1-22 vs X/Y)
+    id_cols = ["rsids"] if layout == "ensembl" else [mapping[k] for k in ("SNP", "CHR") if k in mapping]
+    usecols = [raw_of[c] for c in keep]
+    if _HAS_PYARROW:
+        df = read_csv_arrow(path, sep, usecols, [raw_of[c] for c in id_cols])
+    else:
+        df = pd.read_csv(path, sep=sep, usecols=usecols, dtype={raw_of[c]: str for c in id_cols})
     df.columns = df.columns.str.strip()
     print(f"✅ Loaded {label} GWAS | Shape: {df.shape}\n")
 
-    # Handle ENSEMBL-style format
-    if {"rsids", "beta", "pval", "alt", "ref"}.issubset(df.columns):
-        print("🔄 Detected ENSEMBL-style GWAS — remapping columns...")
-        df = df.rename(columns={
-            "rsids": "SNP",
-            "beta": "BETA",
-            "pval": "PVALUE",
-            "alt": "A1",
-            "ref": "A2",
-            "maf": "EAF"
-        })
-        df = df[["SNP", "BETA", "PVALUE", "A1", "A2", "EAF"] if "EAF" in df.columns else ["SNP", "BETA", "PVALUE", "A1", "A2"]]
+    if layout == "ensembl":
+        df = df[keep].rename(columns=ENSEMBL_COLUMNS)
+    elif layout == "custom":
+        df = parse_custom_gwas(df[keep], label)
     else:
-        mapping = auto_map_columns(df, label)
-        if not all(k in mapping for k in ["SNP", "CHR", "BP", "PVALUE"]):
-            if {"riskAllele", "locations", "pValue"}.issubset(df.columns):
-                df = parse_custom_gwas(df, label)
-            else:
-                print(f"❌ ERROR: Missing critical columns in {label} GWAS and no fallback possible.")
-                sys.exit(1)
-        else:
-            for std_col, original_col in mapping.items():
-                if std_col != original_col and original_col in df.columns:
-                    df.rename(columns={original_col: std_col}, inplace=True)
+        df = df[keep].rename(columns={orig: std for std, orig in mapping.items() if std != orig})
 
     df["BETA"] = pd.to_numeric(df["BETA"], errors='coerce')
     df["PVALUE"] = pd.to_numeric(df["PVALUE"], errors='coerce')
@@ -137,24 +215,78 @@ def load_gwas(path, label):
 
     return df
 
-def calculate_f_statistics(df):
-    if "SE" in df.columns:
-        df["F_stat"] = (df["BETA"] ** 2) / (df["SE"] ** 2)
+def _as_number(col, dtype):
+    """Lenient cast; a float NaN ("nan" text) becomes null so drop_nulls treats it as missing, like dropna.
+
+    Integers are parsed through Float64, as pandas writes "46298401.0" for an integer column
+    with gaps; whole values are kept and fractional ones become null.
+    """
+    expr = pl.col(col).cast(pl.Float64, strict=False).fill_nan(None)
+    if dtype == pl.Int64:
+        return pl.when(expr == expr.floor()).then(expr.cast(pl.Int64, strict=False))
+    return expr
+
+def scan_gwas(path, label):
+    """Polars counterpart of load_gwas: same column handling, but kept lazy."""
+    print(f"📥 Scanning {label} GWAS: {path}")
+    lf = pl.scan_csv(path, separator=gwas_sep(path), infer_schema=False, null_values=NA_STRINGS)
+    raw_cols = lf.collect_schema().names()
+    columns = [c.strip() for c in raw_cols]
+    lf = lf.rename(dict(zip(raw_cols, columns)))
+
+    layout, mapping, keep = plan_columns(columns, label)
+    lf = lf.select(keep)
+    if layout == "ensembl":
+        lf = lf.rename(ENSEMBL_COLUMNS, strict=False)
+    elif layout == "custom":
+        print(f"⚙️ Parsing custom GWAS structure for {label}...")
+        lf = lf.with_columns(
+            pl.col("riskAllele").str.extract(RISK_ALLELE_RE).alias("SNP"),
+            pl.col("locations").str.extract(LOCATION_RE, 1).alias("CHR"),
+            pl.col("locations").str.extract(LOCATION_RE, 2)
+                               .cast(pl.Int64, strict=False).alias("BP"),
+            _as_number("pValue", pl.Float64).alias("PVALUE"),
+        ).drop_nulls(subset=["SNP", "CHR", "BP", "PVALUE"])
     else:
-        print("⚠️ WARNING: SE column not found — Skipping F-statistic filtering")
-        df["F_stat"] = 9999
-    return df
+        lf = lf.rename({orig: std for std, orig in mapping.items() if std != orig})
 
-def main():
-    if len(sys.argv) != 4:
-        print(__doc__)
-        sys.exit(1)
+    # Everything was scanned as text; type the numeric columns like pandas would
+    schema = lf.collect_schema().names()
+    numeric = {"BP": pl.Int64, "BETA": pl.Float64, "SE": pl.Float64, "PVALUE": pl.Float64, "EAF": pl.Float64}
+    lf = lf.with_columns(_as_number(c, t) for c, t in numeric.items() if c in schema)
+    if "SE" not in schema:
+        print("🧠 Inferring SE from BETA and PVALUE...")
+        z = pl.col("PVALUE").map_batches(lambda s: pl.Series(abs_z_from_p(s.to_numpy())),
+                                         return_dtype=pl.Float64)
+        lf = lf.with_columns((pl.col("BETA").abs() / z).fill_nan(None).alias("SE"))
+    return lf.drop_nulls(subset=["SNP", "BETA", "SE", "PVALUE"])
+
+def required_columns(columns):
+    return [c for c in REQUIRED_COLUMNS if c in columns]
+
+def remove_indels(df, label):
+    if "A1" in df.columns and "A2" in df.columns:
+        df = df[df["A1"].isin(_ALLELES) & df["A2"].isin(_ALLELES)]
+        print(f"🧹 {label} after INDEL removal: {df.shape}\n")
+    else:
+        print(f"⚠️ WARNING: No A1/A2 columns found in {label} — Skipping INDEL filtering\n")
+    return df
 
-    exposure_path, outcome_path, output_path = sys.argv[1], sys.argv[2], sys.argv[3]
+def filter_weak_instruments(df, threshold=10):
+    """Keep SNPs with F >= threshold; F_stat is attached to the survivors only."""
+    if "SE" in df.columns:
+        beta = df["BETA"].to_numpy(dtype=np.float64)
+        se = df["SE"].to_numpy(dtype=np.float64)
+        f_stat = (beta * beta) / (se * se)
+    else:
+        print("⚠️ WARNING: SE column not found — Skipping F-statistic filtering")
+        f_stat = np.full(len(df), 9999)
 
-    print_header()
-    validate_inputs([exposure_path, outcome_path], ["Exposure", "Outcome"])
+    keep = f_stat >= threshold
+    print(f"🚫 Removing weak SNPs with F < {threshold}: {int((f_stat < threshold).sum())} SNPs\n")
+    return df.loc[keep].assign(F_stat=f_stat[keep])
 
+def harmonise(exposure_path, outcome_path):
     exposure = load_gwas(exposure_path, "Exposure")
 
     # --- Relax p-value threshold if needed --- #
@@ -165,36 +297,93 @@ def main():
     else:
         exposure = genome_wide
 
+    # ---- Row filters first, so the merge only sees surviving SNPs ----
+    exposure = remove_indels(exposure.dropna(subset=required_columns(exposure.columns)), "Exposure")
+
+    print("🧮 Calculating F-statistics for exposure SNPs...")
+    exposure = filter_weak_instruments(exposure)
+    print(f"📏 Exposure after F-stat filtering: {exposure.shape}\n")
+
     outcome = load_gwas(outcome_path, "Outcome")
+    outcome = remove_indels(outcome.dropna(subset=required_columns(outcome.columns)), "Outcome")
 
-    common_snps = set(exposure["SNP"]).intersection(set(outcome["SNP"]))
-    print(f"🔗 Shared SNPs between exposure & outcome: {len(common_snps)}\n")
+    # ---- Merge (no up-front SNP intersection — the inner merge performs it) ----
+    merged = pd.merge(exposure, outcome, on="SNP", how="inner", suffixes=("_exp", "_out"))
+    print(f"🔗 Shared SNPs between exposure & outcome: {merged['SNP'].nunique()}\n")
+    return merged
 
-    exposure = exposure[exposure["SNP"].isin(common_snps)].dropna()
-    outcome = outcome[outcome["SNP"].isin(common_snps)].dropna()
+def harmonise_lazy(exposure_path, outcome_path):
+    # Exposure shrinks to its p < 5e-4 hits while streaming, so collect it early
+    exposure = (scan_gwas(exposure_path, "Exposure")
+                .filter(pl.col("PVALUE") < 5e-4)
+                .collect(engine="streaming"))
+    print(f"✅ Loaded Exposure GWAS (p < 5e-4) | Shape: {exposure.shape}\n")
 
+    # --- Relax p-value threshold if needed --- #
+    genome_wide = exposure.filter(pl.col("PVALUE") < 5e-8)
+    if genome_wide.height < 10:
+        print(f"⚠️ Only {genome_wide.height} SNPs with p < 5e-8 — relaxing threshold to p < 5e-5")
+    else:
+        exposure = genome_wide
+
+    exposure = exposure.drop_nulls(subset=required_columns(exposure.columns))
     if "A1" in exposure.columns and "A2" in exposure.columns:
-        exposure = exposure[exposure["A1"].apply(is_snp_allele) & exposure["A2"].apply(is_snp_allele)]
-        outcome = outcome[outcome["A1"].apply(is_snp_allele) & outcome["A2"].apply(is_snp_allele)]
-        print(f"🧹 Exposure after INDEL removal: {exposure.shape}")
-        print(f"🧹 Outcome after INDEL removal: {outcome.shape}\n")
+        exposure = exposure.filter(pl.col("A1").is_in(_ALLELES) & pl.col("A2").is_in(_ALLELES))
+        print(f"🧹 Exposure after INDEL removal: {exposure.shape}\n")
     else:
-        print("⚠️ WARNING: No A1/A2 columns found — Skipping INDEL filtering\n")
+        print("⚠️ WARNING: No A1/A2 columns found in Exposure — Skipping INDEL filtering\n")
 
     print("🧮 Calculating F-statistics for exposure SNPs...")
-    exposure = calculate_f_statistics(exposure)
+    exposure = exposure.with_columns((pl.col("BETA") ** 2 / pl.col("SE") ** 2).alias("F_stat"))
+    weak = exposure.filter(pl.col("F_stat") < 10).height
+    print(f"🚫 Removing weak SNPs with F < 10: {weak} SNPs\n")
+    exposure = exposure.filter(pl.col("F_stat") >= 10)
+    print(f"📏 Exposure after F-stat filtering: {exposure.shape}\n")
+
+    # Outcome stays lazy: null/INDEL filters and the join run while streaming
+    outcome = scan_gwas(outcome_path, "Outcome")
+    outcome_cols = outcome.collect_schema().names()
+    outcome = outcome.drop_nulls(subset=required_columns(outcome_cols))
+    if "A1" in outcome_cols and "A2" in outcome_cols:
+        outcome = outcome.filter(pl.col("A1").is_in(_ALLELES) & pl.col("A2").is_in(_ALLELES))
+    else:
+        print("⚠️ WARNING: No A1/A2 columns found in Outcome — Skipping INDEL filtering\n")
+
+    # Suffix overlapping columns the way pd.merge(suffixes=("_exp", "_out")) does
+    shared = (set(exposure.columns) & set(outcome_cols)) - {"SNP"}
+    merged = (exposure.lazy().rename({c: f"{c}_exp" for c in shared})
+              .join(outcome.rename({c: f"{c}_out" for c in shared}),
+                    on="SNP", how="inner", maintain_order="left")
+              .collect(engine="streaming")
+              .to_pandas())
+    print(f"🔗 Shared SNPs between exposure & outcome: {merged['SNP'].nunique()}\n")
+    return merged
+
+def write_merged(merged, output_path):
+    if output_path.endswith(".parquet"):
+        if not _HAS_PYARROW:
+            print("❌ ERROR: Parquet output requires pyarrow — use a .csv output path instead.")
+            sys.exit(1)
+        merged.to_parquet(output_path, compression="zstd", index=False)
+    else:
+        merged.to_csv(output_path, index=False)
 
-    weak_snps = exposure[exposure["F_stat"] < 10]["SNP"]
-    print(f"🚫 Removing weak SNPs with F < 10: {len(weak_snps)} SNPs\n")
+def main():
+    if len(sys.argv) != 4:
+        print(__doc__)
+        sys.exit(1)
+
+    exposure_path, outcome_path, output_path = sys.argv[1], sys.argv[2], sys.argv[3]
 
-    exposure = exposure[exposure["F_stat"] >= 10]
-    outcome = outcome[outcome["SNP"].isin(exposure["SNP"])]
+    print_header()
+    validate_inputs([exposure_path, outcome_path], ["Exposure", "Outcome"])
 
-    print(f"📏 Exposure after F-stat filtering: {exposure.shape}")
-    print(f"📏 Outcome after F-stat filtering: {outcome.shape}\n")
+    if _HAS_POLARS:
+        merged = harmonise_lazy(exposure_path, outcome_path)
+    else:
+        merged = harmonise(exposure_path, outcome_path)
 
-    # ---- Merge & Capitalize columns ----
-    merged = pd.merge(exposure, outcome, on="SNP", suffixes=("_exp", "_out"))
+    # ---- Capitalize columns ----
     merged.columns = [col.upper() for col in merged.columns]  # R/TwoSampleMR expects uppercase!
 
     # ---- Ensure EAF columns exist for downstream analysis ----
@@ -208,7 +397,7 @@ def main():
     merged['EAF.OUTCOME'] = merged['EAF_OUT']
 
     print(f"🔀 Final merged dataset shape: {merged.shape}\n")
-    merged.to_csv(output_path, index=False)
+    write_merged(merged, output_path)
     print(f"✅ Filtered & harmonised GWAS saved to: {output_path}")
     print("=" * 60 + "\n")
 
@@ -14,6 +14,9 @@ Description:
 - ALSO generates F-stat histogram + density (from ld_pruned_SNPs.csv)
   and a funnel plot (from harmonised_data.csv).
 - Outputs all plots and full SNP table.
+
+Figures are written as PNG only. Set MRCOPE_FIG_FORMATS (e.g. "png,pdf,svg")
+to also write vector copies.
 """
 
 import sys
@@ -22,15 +25,27 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib as mpl
+mpl.use("Agg")  # files only; never pay for an interactive backend
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.ticker import FixedFormatter, FixedLocator
+from scipy.signal import fftconvolve
 
-# Optional, for KDE and nicer hist aesthetics
+# Optional, for nicer plot aesthetics
 try:
     import seaborn as sns
     _HAS_SNS = True
 except Exception:
     _HAS_SNS = False
 
+# Optional, multi-threaded CSV parsing
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+CSV_ENGINE = "pyarrow" if _HAS_PYARROW else "c"
+
 # =========================
 # Global visual aesthetics
 # =========================
@@ -66,6 +81,15 @@ COL_GREEN  = "#55A868"  # density fill
 COL_RED    = "#D62728"  # threshold/null line
 GRID_COLOR = "#E6E8EC"
 
+# Columns read from MR_Formatted_Results.csv for the method-level plot
+SUMMARY_COLS = ["IVW_OR", "WM_OR", "Egger_OR",
+                "IVW_CI_Lower", "IVW_CI_Upper",
+                "WM_CI_Lower", "WM_CI_Upper",
+                "Egger_CI_Lower", "Egger_CI_Upper"]
+
+# Output formats for save_all (vector formats are slow and large for scatters)
+FIG_FORMATS = tuple(f.strip() for f in os.environ.get("MRCOPE_FIG_FORMATS", "png").split(",") if f.strip())
+
 
 def validate_inputs(paths, labels):
     for path, label in zip(paths, labels):
@@ -74,9 +98,12 @@ def validate_inputs(paths, labels):
             sys.exit(1)
 
 
-def safe_load_csv(path, label):
+def safe_load_csv(path, label, usecols=None, dtype=None):
     try:
-        df = pd.read_csv(path)
+        if callable(usecols):
+            # The pyarrow engine only accepts explicit column names
+            usecols = [c for c in pd.read_csv(path, nrows=0).columns if usecols(c)]
+        df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine=CSV_ENGINE)
         if df.empty:
             print(f"⚠️ WARNING: {label} file is empty. Skipping visualisation.")
             sys.exit(0)
@@ -86,37 +113,81 @@ def safe_load_csv(path, label):
         sys.exit(1)
 
 
-def save_all(fig, outdir: Path, stem: str):
-    """Save a figure as PNG, PDF, and SVG with white background."""
+def save_all(fig, outdir: Path, stem: str, formats=FIG_FORMATS):
+    """Save a figure in each of `formats` (PNG by default) with white background."""
     outdir.mkdir(parents=True, exist_ok=True)
-    fig.savefig(outdir / f"{stem}.png", facecolor="white", bbox_inches="tight")
-    fig.savefig(outdir / f"{stem}.pdf", facecolor="white", bbox_inches="tight")
-    fig.savefig(outdir / f"{stem}.svg", facecolor="white", bbox_inches="tight")
+    if len(formats) > 1:
+        # Solve the layout once (no pixels drawn) instead of again inside every savefig
+        fig.draw_without_rendering()
+        fig.set_layout_engine("none")
+    for fmt in formats:
+        fig.savefig(outdir / f"{stem}.{fmt}", facecolor="white", bbox_inches="tight")
+
+
+def partition_quantile(values, qs):
+    """
+    Linearly interpolated quantiles (as Series.quantile, NaNs ignored) using np.partition
+    on just the neighbouring order statistics instead of a full sort.
+    """
+    values = values[~np.isnan(values)]
+    qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+    if values.size == 0:
+        return np.full(qs.shape, np.nan)
+    pos = qs * (values.size - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, values.size - 1)
+    part = np.partition(values, np.unique(np.concatenate([lo, hi])))
+    return part[lo] + (part[hi] - part[lo]) * (pos - lo)
+
+
+def fft_kde(values, xs, gridsize=1024):
+    """
+    Gaussian KDE (Scott's rule bandwidth, as scipy's gaussian_kde) evaluated at `xs`.
+    Samples are linearly binned onto a regular grid and convolved with the kernel via FFT.
+    Returns None when no density can be estimated (fewer than 2 values, or zero variance).
+    """
+    values = values[np.isfinite(values)]
+    n = values.size
+    if n < 2:
+        return None
+    bw = values.std(ddof=1) * n ** (-0.2)
+    if not np.isfinite(bw) or bw <= 0:
+        return None
+    lo = min(values.min(), xs[0]) - 3 * bw
+    hi = max(values.max(), xs[-1]) + 3 * bw
+    grid = np.linspace(lo, hi, gridsize)
+    delta = grid[1] - grid[0]
+
+    pos = (values - lo) / delta
+    i = np.minimum(pos.astype(np.intp), gridsize - 2)
+    frac = pos - i
+    counts = (np.bincount(i, weights=1.0 - frac, minlength=gridsize)
+              + np.bincount(i + 1, weights=frac, minlength=gridsize))
+
+    half = int(min(gridsize, np.ceil(4 * bw / delta)))
+    kx = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (kx / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    dens = fftconvolve(counts, kernel, mode="same") / n
+    return np.interp(xs, grid, np.clip(dens, 0, None))
 
 
 def method_summary_plot(df: pd.DataFrame, output_dir: Path):
-    required_cols = ["IVW_OR", "WM_OR", "Egger_OR",
-                     "IVW_CI_Lower", "IVW_CI_Upper",
-                     "WM_CI_Lower", "WM_CI_Upper",
-                     "Egger_CI_Lower", "Egger_CI_Upper"]
-    if not all(col in df.columns for col in required_cols):
+    if not all(col in df.columns for col in SUMMARY_COLS):
         print(f"❌ ERROR: Required columns missing from MR summary results. Found columns: {df.columns.tolist()}")
         sys.exit(1)
 
     methods = ["IVW", "Weighted Median", "Egger"]
-    ORs     = [df["IVW_OR"].iloc[0], df["WM_OR"].iloc[0], df["Egger_OR"].iloc[0]]
-    Lower   = [df["IVW_CI_Lower"].iloc[0], df["WM_CI_Lower"].iloc[0], df["Egger_CI_Lower"].iloc[0]]
-    Upper   = [df["IVW_CI_Upper"].iloc[0], df["WM_CI_Upper"].iloc[0], df["Egger_CI_Upper"].iloc[0]]
+    row     = df.iloc[0]
+    ORs     = row[["IVW_OR", "WM_OR", "Egger_OR"]].to_numpy(dtype=np.float64)
+    Lower   = row[["IVW_CI_Lower", "WM_CI_Lower", "Egger_CI_Lower"]].to_numpy(dtype=np.float64)
+    Upper   = row[["IVW_CI_Upper", "WM_CI_Upper", "Egger_CI_Upper"]].to_numpy(dtype=np.float64)
 
     print("📊 Creating method-level summary plot...")
-    fig, ax = plt.subplots(figsize=(10, 6), dpi=300)
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=300, layout="constrained")
     ax.grid(axis="y")
 
     x = range(len(methods))
-    yerr = [
-        [OR - low for OR, low in zip(ORs, Lower)],
-        [up - OR for OR, up in zip(ORs, Upper)]
-    ]
+    yerr = np.vstack([ORs - Lower, Upper - ORs])
 
     ax.errorbar(x, ORs, yerr=yerr, fmt="none", ecolor=COL_CI, elinewidth=2, capsize=6, zorder=1, label="95% CI")
     ax.scatter(x, ORs, s=60, color=COL_POINT, zorder=2, label="Point estimate")
@@ -126,12 +197,11 @@ def method_summary_plot(df: pd.DataFrame, output_dir: Path):
     ax.set_ylabel("Odds Ratio (95% CI)")
     ax.set_title("MR Effect Estimates")
 
-    ymin = min(Lower) - 0.05
-    ymax = max(Upper) + 0.05
+    ymin = Lower.min() - 0.05
+    ymax = Upper.max() + 0.05
     ax.set_ylim(ymin, ymax)
 
     ax.legend(loc="upper left", ncols=2, frameon=False)
-    plt.tight_layout()
     save_all(fig, output_dir, "mr_summary_estimates")
     plt.close(fig)
     print(f"✅ Saved: {output_dir/'mr_summary_estimates.png'}\n")
@@ -140,49 +210,56 @@ def method_summary_plot(df: pd.DataFrame, output_dir: Path):
 def snp_forest_plot(snp_df: pd.DataFrame, output_dir: Path):
     print("📊 Creating forest plot of top 30 SNPs...")
 
-    snp_df = snp_df.copy()
-    snp_df["Lower_CI"] = snp_df["IVW_Lower_95"]
-    snp_df["Upper_CI"] = snp_df["IVW_Upper_95"]
-
-    (output_dir / "ivw_all_snp_ORs.csv").write_text(snp_df.to_csv(index=False))
+    # Full table plus Lower_CI/Upper_CI aliases of the IVW bounds, written without copying the frame
+    cols = list(snp_df.columns)
+    snp_df.to_csv(output_dir / "ivw_all_snp_ORs.csv", index=False,
+                  columns=cols + ["IVW_Lower_95", "IVW_Upper_95"],
+                  header=cols + ["Lower_CI", "Upper_CI"])
     print(f"✅ Full SNP results saved: {output_dir/'ivw_all_snp_ORs.csv'}\n")
 
-    top_snp_df = snp_df.nlargest(30, "IVW_OR").copy().sort_values("IVW_OR", ascending=False).reset_index(drop=True)
+    # Top 30 by OR: partition in O(N), then sort only the selected rows
+    neg_or = -snp_df["IVW_OR"].to_numpy(dtype=np.float64)
+    k = min(30, int(np.count_nonzero(~np.isnan(neg_or))))
+    idx = np.argpartition(neg_or, k - 1)[:k] if k else np.empty(0, dtype=np.intp)
+    idx = idx[np.argsort(neg_or[idx], kind="stable")]
+    top_snp_df = snp_df.iloc[idx].reset_index(drop=True)
 
-    fig, ax = plt.subplots(figsize=(8, 0.35 * len(top_snp_df) + 2), dpi=300)
+    fig, ax = plt.subplots(figsize=(8, 0.35 * len(top_snp_df) + 2), dpi=300, layout="constrained")
 
     y = list(range(len(top_snp_df)))
 
-    for i in y:
-        if i % 2 == 0:
-            ax.axhspan(i - 0.5, i + 0.5, color=COL_BAND, zorder=0)
+    # Alternate-row banding as one collection (x in axes coords, y in data coords)
+    bands = [[(0, i - 0.5), (1, i - 0.5), (1, i + 0.5), (0, i + 0.5)] for i in y[::2]]
+    ax.add_collection(PolyCollection(bands, color=COL_BAND,
+                                     transform=ax.get_yaxis_transform(), zorder=0))
+
+    or_arr = top_snp_df["IVW_OR"].to_numpy()
+    lower = top_snp_df["IVW_Lower_95"].to_numpy()
+    upper = top_snp_df["IVW_Upper_95"].to_numpy()
 
     ax.errorbar(
-        top_snp_df["IVW_OR"], y,
-        xerr=[
-            top_snp_df["IVW_OR"] - top_snp_df["Lower_CI"],
-            top_snp_df["Upper_CI"] - top_snp_df["IVW_OR"]
-        ],
+        or_arr, y,
+        xerr=[or_arr - lower, upper - or_arr],
         fmt='none', ecolor=COL_CI, elinewidth=2, capsize=3, zorder=1
     )
 
-    colors = (top_snp_df["IVW_OR"] >= 1).map({True: COL_POS, False: COL_NEG}).values
-    ax.scatter(top_snp_df["IVW_OR"], y, s=40, color=colors, zorder=2)
+    colors = np.where(or_arr >= 1.0, COL_POS, COL_NEG)
+    ax.scatter(or_arr, y, s=40, color=colors, zorder=2)
 
     ax.axvline(x=1, linestyle="--", color=COL_REF, linewidth=1.2, zorder=0)
-    ax.set_yticks(y, top_snp_df["SNP"])
+    ax.yaxis.set_major_locator(FixedLocator(y))
+    ax.yaxis.set_major_formatter(FixedFormatter(top_snp_df["SNP"].astype(str).tolist()))
     ax.set_xlabel("IVW Odds Ratio (95% CI)")
     ax.set_title("Top 30 SNPs by IVW OR")
 
-    xmin = float(min(top_snp_df["Lower_CI"]))
-    xmax = float(max(top_snp_df["Upper_CI"]))
+    xmin = float(min(lower))
+    xmax = float(max(upper))
     xpad = (xmax - xmin) * 0.05 if xmax > xmin else 0.1
     ax.set_xlim(left=max(0.5, xmin - xpad), right=xmax + xpad)
 
     ax.tick_params(axis="y", pad=4)
     ax.grid(axis="x")
 
-    plt.tight_layout()
     save_all(fig, output_dir, "ivw_per_snp_forest_plot")
     plt.close(fig)
     print(f"✅ Saved: {output_dir/'ivw_per_snp_forest_plot.png'}\n")
@@ -191,35 +268,33 @@ def snp_forest_plot(snp_df: pd.DataFrame, output_dir: Path):
 def fstat_plots(output_dir: Path):
     """
     Read ld_pruned_SNPs.csv from output_dir and make:
-      - Fstat_Histogram.(png|pdf|svg)
-      - Fstat_Density.(png|pdf|svg)
+      - Fstat_Histogram.<FIG_FORMATS>
+      - Fstat_Density.<FIG_FORMATS>
     """
     ld_path = output_dir / "ld_pruned_SNPs.csv"
     if not ld_path.exists():
         print("⚠️ ld_pruned_SNPs.csv not found — skipping F-stat plots.")
         return
 
-    ld = pd.read_csv(ld_path)
-    if "F_STAT" not in ld.columns:
+    if "F_STAT" not in pd.read_csv(ld_path, nrows=0).columns:
         print("⚠️ 'F_STAT' column missing in ld_pruned_SNPs.csv — skipping F-stat plots.")
         return
+    ld = pd.read_csv(ld_path, usecols=["F_STAT"], dtype={"F_STAT": "float64"}, engine=CSV_ENGINE)
 
     if _HAS_SNS:
         sns.set_theme(context="talk", style="whitegrid")
     print("\nSummary of F-statistics:\n", ld["F_STAT"].describe())
 
     # X-axis cap to avoid long tails squashing the bulk
-    fmax = ld["F_STAT"].quantile(0.995)
+    fmax = partition_quantile(ld["F_STAT"].to_numpy(dtype=np.float64), 0.995)[0]
     xmax = float(np.ceil(max(10, fmax) / 5) * 5)
 
     # Histogram
     bins = np.arange(0, max(xmax, ld["F_STAT"].max()) + 5, 5)
-    fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
-    if _HAS_SNS:
-        import seaborn as sns  # local
-        sns.histplot(ld["F_STAT"], bins=bins, color=COL_BLUE, edgecolor="white", alpha=0.8, ax=ax)
-    else:
-        ax.hist(ld["F_STAT"], bins=bins, color=COL_BLUE, edgecolor="white", alpha=0.8)
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=300, layout="constrained")
+    counts, edges = np.histogram(ld["F_STAT"].dropna().to_numpy(), bins=bins)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge",
+           color=COL_BLUE, edgecolor="white", alpha=0.8)
     ax.axvline(10, color=COL_RED, linestyle="--", linewidth=1.2)
     ax.set_title("Distribution of F-statistics for Instruments")
     ax.set_xlabel("F-statistic")
@@ -227,29 +302,27 @@ def fstat_plots(output_dir: Path):
     ax.set_xlim(0, xmax)
     for s in ["top", "right"]:
         ax.spines[s].set_visible(False)
-    plt.tight_layout()
     save_all(fig, output_dir, "Fstat_Histogram")
     plt.close(fig)
 
     # Density
-    fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
-    if _HAS_SNS:
-        sns.kdeplot(ld["F_STAT"], fill=True, color=COL_GREEN, alpha=0.7, linewidth=1.5, ax=ax)
-    else:
-        # Fallback to a simple KDE via numpy (rough)
-        from scipy.stats import gaussian_kde
-        xs = np.linspace(0, xmax, 512)
-        kde = gaussian_kde(ld["F_STAT"].dropna())
-        ax.fill_between(xs, kde(xs), color=COL_GREEN, alpha=0.7)
-        ax.plot(xs, kde(xs), color="black", linewidth=1.0)
+    xs = np.linspace(0, xmax, 512)
+    dens = fft_kde(ld["F_STAT"].to_numpy(dtype=np.float64), xs)
+    if dens is None:
+        print("⚠️ Fewer than 2 distinct F-statistics — skipping the F-stat density plot.")
+        print(f"✅ Saved: {output_dir/'Fstat_Histogram.png'}")
+        return
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=300, layout="constrained")
+    ax.fill_between(xs, dens, color=COL_GREEN, alpha=0.7, linewidth=0)
+    ax.plot(xs, dens, color=COL_GREEN, linewidth=1.5)
     ax.axvline(10, color=COL_RED, linestyle="--", linewidth=1.2)
     ax.set_title("Density of F-statistics for Instruments")
     ax.set_xlabel("F-statistic")
     ax.set_ylabel("Density")
     ax.set_xlim(0, xmax)
+    ax.set_ylim(bottom=0)
     for s in ["top", "right"]:
         ax.spines[s].set_visible(False)
-    plt.tight_layout()
     save_all(fig, output_dir, "Fstat_Density")
     plt.close(fig)
 
@@ -259,62 +332,67 @@ def fstat_plots(output_dir: Path):
 def funnel_plot(output_dir: Path):
     """
     Read harmonised_data.csv from output_dir and make:
-      - Funnel_Plot.(png|pdf|svg)
+      - Funnel_Plot.<FIG_FORMATS>
     """
     harm_path = output_dir / "harmonised_data.csv"
     if not harm_path.exists():
         print("⚠️ harmonised_data.csv not found — skipping funnel plot.")
         return
 
-    harm = pd.read_csv(harm_path)
+    header = pd.read_csv(harm_path, nrows=0).columns
 
     # Flexible column detection (TwoSampleMR/MR-CoPe styles)
-    beta_exp_col = "BETA_EXP" if "BETA_EXP" in harm.columns else "beta.exposure"
-    beta_out_col = "BETA_OUT" if "BETA_OUT" in harm.columns else "beta.outcome"
-    se_out_col   = "SE_OUT"   if "SE_OUT"   in harm.columns else "se.outcome"
+    beta_exp_col = "BETA_EXP" if "BETA_EXP" in header else "beta.exposure"
+    beta_out_col = "BETA_OUT" if "BETA_OUT" in header else "beta.outcome"
+    se_out_col   = "SE_OUT"   if "SE_OUT"   in header else "se.outcome"
+    needed = [beta_exp_col, beta_out_col, se_out_col]
 
-    if not all(col in harm.columns for col in [beta_exp_col, beta_out_col, se_out_col]):
+    if not all(col in header for col in needed):
         print("⚠️ harmonised_data.csv missing required columns — skipping funnel plot.")
         return
 
-    harm = harm.dropna(subset=[beta_exp_col, beta_out_col, se_out_col])
-    harm = harm[harm[beta_exp_col] != 0]
+    harm = pd.read_csv(harm_path, usecols=needed, dtype=dict.fromkeys(needed, "float64"), engine=CSV_ENGINE)
+
+    bx = harm[beta_exp_col].to_numpy(dtype=np.float64, copy=False)
+    by = harm[beta_out_col].to_numpy(dtype=np.float64, copy=False)
+    se = harm[se_out_col].to_numpy(dtype=np.float64, copy=False)
+    valid = np.isfinite(bx) & np.isfinite(by) & np.isfinite(se) & (bx != 0.0)
+    bx, by, se = bx[valid], by[valid], se[valid]
 
-    if harm.empty:
+    if bx.size == 0:
         print("⚠️ No valid rows for funnel plot after filtering — skipping.")
         return
 
     # Wald ratio per SNP & corresponding SE on ratio scale
-    harm["wald_ratio"] = harm[beta_out_col] / harm[beta_exp_col]
-    harm["se_ratio"]   = harm[se_out_col] / harm[beta_exp_col].abs()
+    wald_ratio = by / bx
+    se_ratio   = se / np.abs(bx)
 
     # IVW estimate on raw beta scale
-    w  = 1.0 / (harm[se_out_col] ** 2)
-    bx = harm[beta_exp_col].values
-    by = harm[beta_out_col].values
-    beta_ivw = float((w * bx * by).sum() / (w * (bx ** 2)).sum())
+    inv_se2 = 1.0 / (se * se)
+    num = np.einsum("i,i,i->", inv_se2, bx, by)
+    den = np.einsum("i,i,i->", inv_se2, bx, bx)
+    beta_ivw = float(num / den)
 
     # Build funnel cones: se = |wald - beta_ivw| / z
     z = 1.96
-    x_min = float(harm["wald_ratio"].quantile(0.005))
-    x_max = float(harm["wald_ratio"].quantile(0.995))
-    x_vals = np.linspace(x_min, x_max, 400)
-    cone = np.abs(x_vals - beta_ivw) / z
+    x_min, x_max = (float(q) for q in partition_quantile(wald_ratio, [0.005, 0.995]))
+    x_vals = np.linspace(x_min, x_max, 400, dtype=np.float32)  # cosmetic shading only
+    cone = np.abs(x_vals - np.float32(beta_ivw)) * np.float32(1.0 / z)
 
-    fig, ax = plt.subplots(figsize=(8, 6), dpi=300)
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=300, layout="constrained")
 
     # Cone shading (95% pseudo-CI around IVW line)
     ax.fill_between(x_vals, 0, cone, color="#B0B7C3", alpha=0.25, linewidth=0)
 
-    # Scatter
-        # Scatter
+    # Scatter (rasterized for large tables so vector outputs embed one image, not a path per SNP)
     ax.scatter(
-        harm["wald_ratio"], harm["se_ratio"],
+        wald_ratio, se_ratio,
         s=40,
         color=COL_BLUE,
         edgecolor="black",
         linewidth=0.4,
-        alpha=0.8
+        alpha=0.8,
+        rasterized=wald_ratio.size > 1000
     )
 
     # Reference & IVW lines
@@ -333,7 +411,6 @@ def funnel_plot(output_dir: Path):
         ax.spines[s].set_visible(False)
     ax.legend(loc="upper right")
 
-    plt.tight_layout()
     save_all(fig, output_dir, "Funnel_Plot")
     plt.close(fig)
 
@@ -358,7 +435,8 @@ def main():
 
     # --- Load and plot method-level summary --- #
     print("📥 Loading MR summary results...")
-    df = safe_load_csv(results_file, "MR summary results")
+    df = safe_load_csv(results_file, "MR summary results",
+                       usecols=lambda c: c in SUMMARY_COLS, dtype=dict.fromkeys(SUMMARY_COLS, "float64"))
     print(f"✅ Loaded: {df.shape}\n")
     method_summary_plot(df, output_dir)
 
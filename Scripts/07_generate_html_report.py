@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from html import escape as html_escape
+import numpy as np
 import pandas as pd
 
 # ------------------------------------------------------------------
@@ -26,23 +31,94 @@ if len(sys.argv) != 5:
 
 summary_csv, snps_csv, html_template, output_html = sys.argv[1:]
 
+# Optional, multi-threaded CSV parsing
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
 # ----------------------------- IO helpers -----------------------------
-def read_csv_safe(path):
+# SNP-table field -> harmonised_data.csv aliases, in priority order
+HARM_SCHEMA = {
+    "snp":  ("SNP", "rsid", "ID"),
+    "chr":  ("chr.exposure", "chr.outcome", "CHR", "chr", "chrom", "CHROM"),
+    "bp":   ("pos.exposure", "pos.outcome", "BP", "bp", "position", "POS"),
+    "ea_x": ("effect_allele.exposure", "EA.exposure", "EA_Exposure", "effect_allele_exposure"),
+    "oa_x": ("other_allele.exposure", "OA.exposure", "OA_Exposure", "other_allele_exposure"),
+    "ea_y": ("effect_allele.outcome", "EA.outcome", "EA_Outcome", "effect_allele_outcome"),
+    "oa_y": ("other_allele.outcome", "OA.outcome", "OA_Outcome", "other_allele_outcome"),
+    "bx":   ("beta.exposure", "BETA.exposure", "beta_exposure", "BETA_Exposure", "b_exp", "b.exposure"),
+    "sx":   ("se.exposure", "SE.exposure", "se_exposure", "SE_Exposure", "se_exp"),
+    "px":   ("pval.exposure", "P.exposure", "p.exposure", "pval_exposure", "P_Exposure", "p_exp"),
+    "by":   ("beta.outcome", "BETA.outcome", "beta_outcome", "BETA_Outcome", "b_out", "b.outcome"),
+    "sy":   ("se.outcome", "SE.outcome", "se_outcome", "SE_Outcome", "se_out"),
+    "py":   ("pval.outcome", "P.outcome", "p.outcome", "pval_outcome", "P_Outcome", "p_out"),
+    "eafx": ("eaf.exposure", "EAF.exposure", "eaf_exposure", "EAF_Exposure"),
+    "eafy": ("eaf.outcome", "EAF.outcome", "eaf_outcome", "EAF_Outcome"),
+}
+
+# Every harmonised_data.csv column the report can pick (lower-cased aliases);
+# BETA_EXP / SE_EXP are only used by the F-statistic fallback
+HARM_COLUMNS = frozenset(
+    a.lower() for aliases in HARM_SCHEMA.values() for a in aliases
+) | {"beta_exp", "se_exp"}
+HARM_FLOATS = frozenset(
+    a.lower() for key in ("bx", "sx", "px", "by", "sy", "py", "eafx", "eafy")
+    for a in HARM_SCHEMA[key]
+) | {"beta_exp", "se_exp"}
+
+# ld_pruned_SNPs.csv is only read for its per-SNP F statistic
+LD_COLUMNS = frozenset(("snp", "rsid", "id", "f_stat", "fstat", "f"))
+LD_FLOATS  = frozenset(("f_stat", "fstat", "f"))
+
+def read_csv_safe(path, usecols=None, floats=frozenset()):
+    """Read a CSV (empty frame if missing/unreadable); `usecols` keeps header names whose lower() is in it.
+
+    Kept columns whose lower() is in `floats` are declared float64 to the pyarrow reader,
+    which then skips type inference for them.
+    """
     try:
-        if path and os.path.exists(path) and os.path.getsize(path) > 0:
-            return pd.read_csv(path)
+        size = os.stat(path).st_size if path else 0  # one syscall; missing -> OSError
+    except OSError:
+        size = 0
+    if size == 0:
+        return pd.DataFrame()
+    try:
+        if usecols is not None:
+            header = pd.read_csv(path, nrows=0).columns
+            usecols = [c for c in header if c.lower() in usecols] or None
+        if _HAS_PYARROW:
+            dtype = {c: "float64" for c in (usecols or []) if c.lower() in floats} or None
+            try:
+                df = pd.read_csv(path, engine="pyarrow", usecols=usecols, dtype=dtype)
+                # pyarrow leaves missing text cells as None; keep the C parser's NaN
+                obj = df.columns[df.dtypes == object]
+                df[obj] = df[obj].where(df[obj].notna(), np.nan)
+                return df
+            except Exception:
+                pass  # fall back to the C parser
+        return pd.read_csv(path, usecols=usecols)
     except Exception:
-        pass
-    return pd.DataFrame()
-
-summary   = read_csv_safe(summary_csv)
-snps_ivw  = read_csv_safe(snps_csv)
-harm      = read_csv_safe("harmonised_data.csv")
-ld_pruned = read_csv_safe("ld_pruned_SNPs.csv")  # for F-stat column
-
-# Optional MR-PRESSO outputs
-presso_summary  = read_csv_safe("mr_presso_summary.csv")
-presso_outliers = read_csv_safe("mr_presso_outliers.csv")
+        return pd.DataFrame()
+
+# Independent reads; the CSV parsers release the GIL, so overlap the I/O
+with ThreadPoolExecutor(max_workers=6) as pool:
+    f_summary   = pool.submit(read_csv_safe, summary_csv)
+    f_snps_ivw  = pool.submit(read_csv_safe, snps_csv)
+    f_harm      = pool.submit(read_csv_safe, "harmonised_data.csv", usecols=HARM_COLUMNS, floats=HARM_FLOATS)
+    f_ld_pruned = pool.submit(read_csv_safe, "ld_pruned_SNPs.csv", usecols=LD_COLUMNS, floats=LD_FLOATS)
+
+    # Optional MR-PRESSO outputs
+    f_presso_summary  = pool.submit(read_csv_safe, "mr_presso_summary.csv")
+    f_presso_outliers = pool.submit(read_csv_safe, "mr_presso_outliers.csv")
+
+summary         = f_summary.result()
+snps_ivw        = f_snps_ivw.result()
+harm            = f_harm.result()
+ld_pruned       = f_ld_pruned.result()
+presso_summary  = f_presso_summary.result()
+presso_outliers = f_presso_outliers.result()
 
 # ----------------------------- formatters -----------------------------
 DASH = "—"
@@ -53,14 +129,16 @@ def _is_na(x):
     except Exception:
         return False
 
+_FLOAT_SPECS = {1: "%.1f", 3: "%.3f", 4: "%.4f", 6: "%.6f"}
+
 def fmt_float(x, d=3, dash=DASH):
     try:
-        if _is_na(x): return dash
-        v = float(x)
-        if _is_na(v): return dash
-        return f"{v:.{d}f}"
+        v = float(x)  # None / pd.NA / non-numeric text raise here
     except Exception:
         return dash
+    if v != v:  # NaN
+        return dash
+    return (_FLOAT_SPECS.get(d) or f"%.{d}f") % v
 
 def fmt_p(x, dash=DASH):
     try:
@@ -72,6 +150,32 @@ def fmt_p(x, dash=DASH):
     except Exception:
         return dash
 
+def _float_values(values):
+    """float64 array for a column; NA and unparseable entries become NaN."""
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.to_numpy(dtype=np.float64, na_value=np.nan)
+    return pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64)
+
+def fmt_float_col(values, d=3, dash=DASH):
+    """Column version of fmt_float: NaN/unparseable -> dash, else fixed d decimals."""
+    v = _float_values(values)
+    out = np.full(v.shape, dash, dtype=object)
+    ok = ~np.isnan(v)
+    fmt = f"{{:.{d}f}}".format
+    out[ok] = [fmt(x) for x in v[ok].tolist()]
+    return out
+
+def fmt_p_col(values, dash=DASH):
+    """Column version of fmt_p: split on the 1e-3 threshold, format each side in one pass."""
+    v = _float_values(values)
+    out = np.full(v.shape, dash, dtype=object)
+    with np.errstate(invalid="ignore"):
+        small, large = v < 1e-3, v >= 1e-3
+    out[small] = [f"{x:.3g}" for x in v[small].tolist()]
+    out[large] = [f"{x:.4f}" for x in v[large].tolist()]
+    return out
+
 def ci_str(l, u, dash=DASH):
     if l in (None, dash, "") or u in (None, dash, ""):
         return dash
@@ -81,17 +185,45 @@ def ci_str(l, u, dash=DASH):
     except Exception:
         return f"{l}–{u}"
 
+def ci_str_col(l, u, dash=DASH):
+    """Column version of ci_str for non-missing bounds (unparseable pairs are shown raw)."""
+    lo, hi = fmt_float_col(l, 3, dash), fmt_float_col(u, 3, dash)
+    out = lo + "–" + hi
+    raw = (lo == dash) | (hi == dash)
+    out[raw] = [f"{html_escape(str(a))}–{html_escape(str(b))}"
+                for a, b in zip(np.asarray(l, dtype=object)[raw], np.asarray(u, dtype=object)[raw])]
+    return out
+
+_HTML_SPECIAL = r"[&<>\"']"
+
+def escape_col(values):
+    """HTML-escape a text column; columns without special characters are returned as-is."""
+    s = pd.Series(values).astype(str)
+    if s.str.contains(_HTML_SPECIAL).any():
+        s = s.map(html_escape)
+    return s.to_numpy()
+
 # ----------------------------- column picking -----------------------------
-def pick(cols, *cands):
-    for c in cands:
-        if c in cols:
-            return c
-    return None
+def resolve_columns(columns, schema):
+    """Map each schema field to its first matching column (exact name first, then case-insensitive)."""
+    exact = set(columns)
+    low = {}
+    for name in columns:
+        low.setdefault(name.lower(), name)
+    return {
+        key: next((a for a in aliases if a in exact), None)
+             or next((low[a.lower()] for a in aliases if a.lower() in low), None)
+        for key, aliases in schema.items()
+    }
+
+@lru_cache(maxsize=8)
+def _lower_map(cols):
+    return {c.lower(): c for c in cols}
 
 def pick_ci(df, *cands):
     if df is None or df.empty:
         return None
-    low = {c.lower(): c for c in df.columns}
+    low = _lower_map(tuple(df.columns))
     for cand in cands:
         if cand.lower() in low:
             return low[cand.lower()]
@@ -185,11 +317,9 @@ EG_I2_f  = fmt_float(EG_I2, 1) if EG_I2 is not None else DASH
 EG_INT_P_f = fmt_p(EG_INT_P)
 
 # ----------------------------- F-stat map (robust) -----------------------------
-def norm_id(x):
-    try:
-        return str(x).strip().upper()
-    except Exception:
-        return None
+def norm_id_col(values):
+    """Normalised SNP keys for a column: str, stripped, upper-cased."""
+    return values.astype(str).str.strip().str.upper()
 
 f_map = {}
 
@@ -198,12 +328,11 @@ if not ld_pruned.empty:
     c_snp_ld = next((c for c in ld_pruned.columns if c.lower() in ("snp","rsid","id")), None)
     c_f      = next((c for c in ld_pruned.columns if c.lower() in ("f_stat","fstat","f")), None)
     if c_snp_ld and c_f:
-        for _, r in ld_pruned[[c_snp_ld, c_f]].dropna().iterrows():
-            key = norm_id(r[c_snp_ld])
-            try:
-                f_map[key] = float(r[c_f])
-            except Exception:
-                pass
+        ld_sub = ld_pruned[[c_snp_ld, c_f]].dropna()
+        keys = norm_id_col(ld_sub[c_snp_ld]).to_numpy()
+        vals = pd.to_numeric(ld_sub[c_f], errors="coerce").to_numpy(dtype=float)
+        ok = ~np.isnan(vals)
+        f_map = dict(zip(keys[ok].tolist(), vals[ok].tolist()))
 
 # 2) Fallback: compute F = (beta_x / se_x)^2 from harmonised if missing
 def pick_col(df, *cands):
@@ -217,17 +346,13 @@ if not harm.empty:
     sx_col = pick_col(harm, "se.exposure",   "SE.exposure",   "SE_EXP",   "se.exposure", "se_exp")
     snp_col = pick_col(harm, "SNP", "rsid", "ID")
     if bx_col and sx_col and snp_col:
-        harm_sub = harm[[snp_col, bx_col, sx_col]].dropna().copy()
-        harm_sub["__SNP_KEY__"] = harm_sub[snp_col].map(norm_id)
-        with pd.option_context('mode.use_inf_as_na', True):
-            harm_sub["__F__"] = (harm_sub[bx_col] / harm_sub[sx_col]) ** 2
-        for _, r in harm_sub.dropna(subset=["__SNP_KEY__", "__F__"]).iterrows():
-            key = r["__SNP_KEY__"]
-            if key and key not in f_map:  # don't overwrite ld_pruned values
-                try:
-                    f_map[key] = float(r["__F__"])
-                except Exception:
-                    pass
+        harm_sub = harm[[snp_col, bx_col, sx_col]].dropna()
+        keys = norm_id_col(harm_sub[snp_col]).to_numpy()
+        f_all = ((harm_sub[bx_col] / harm_sub[sx_col]) ** 2).to_numpy(dtype=float)
+        ok = np.isfinite(f_all) & (keys != "")  # se == 0 gives inf: no F
+        # first harmonised value per SNP; don't overwrite ld_pruned values
+        harm_f_map = dict(zip(keys[ok][::-1].tolist(), f_all[ok][::-1].tolist()))
+        f_map = {**harm_f_map, **f_map}
 
 # ----------------------------- SNP table -----------------------------
 snp_rows_html = []
@@ -237,44 +362,23 @@ def snp_rows_from_harmonised(harm_df, ivw_df):
     if harm_df is None or harm_df.empty:
         return rows
 
-    cols = list(harm_df.columns)
-    def col(*names): return pick(cols, *names)
-
-    c_id  = col("SNP") or col("rsid","ID")
-    c_chr = col("chr.exposure") or col("chr.outcome","CHR","chr","chrom","CHROM")
-    c_bp  = col("pos.exposure") or col("pos.outcome","BP","bp","position","POS")
-
-    c_ea_x = col("effect_allele.exposure") or col("EA.exposure","EA_Exposure","effect_allele_exposure")
-    c_oa_x = col("other_allele.exposure")  or col("OA.exposure","OA_Exposure","other_allele_exposure")
-    c_ea_y = col("effect_allele.outcome")  or col("EA.outcome","EA_Outcome","effect_allele_outcome")
-    c_oa_y = col("other_allele.outcome")   or col("OA.outcome","OA_Outcome","other_allele_outcome")
-
-    c_bx = col("beta.exposure") or col("BETA.exposure","beta_exposure","BETA_Exposure","b_exp","b.exposure")
-    c_sx = col("se.exposure")   or col("SE.exposure","se_exposure","SE_Exposure","se_exp","se.exposure")
-    c_px = col("pval.exposure") or col("P.exposure","p.exposure","pval_exposure","P_Exposure","p_exp","p.exposure")
+    c = resolve_columns(harm_df.columns, HARM_SCHEMA)
+    c_id = c["snp"]
 
-    c_by = col("beta.outcome")  or col("BETA.outcome","beta_outcome","BETA_Outcome","b_out","b.outcome")
-    c_sy = col("se.outcome")    or col("SE.outcome","se_outcome","SE_Outcome","se_out","se.outcome")
-    c_py = col("pval.outcome")  or col("P.outcome","p.outcome","pval_outcome","P_Outcome","p_out","p.outcome")
-
-    c_eafx = col("eaf.exposure") or col("EAF.exposure","eaf_exposure","EAF_Exposure")
-    c_eafy = col("eaf.outcome")  or col("EAF.outcome","eaf_outcome","EAF_Outcome")
-
-    # per-SNP IVW OR map
-    or_map = {}
+    # per-SNP IVW OR / CI lookups (formatted column-wise)
+    or_map, ci_map = {}, {}
     if ivw_df is not None and not ivw_df.empty:
         c_snp_ivw = pick_ci(ivw_df, "SNP")
         c_or      = pick_ci(ivw_df, "IVW_OR", "OR", "IVW OR")
         c_l95     = pick_ci(ivw_df, "IVW_Lower_95", "Lower_95", "CI_Lower")
         c_u95     = pick_ci(ivw_df, "IVW_Upper_95", "Upper_95", "CI_Upper")
         if c_snp_ivw and c_or and c_l95 and c_u95:
-            for _, rr in ivw_df[[c_snp_ivw, c_or, c_l95, c_u95]].dropna().iterrows():
-                or_map[str(rr[c_snp_ivw])] = (
-                    fmt_float(rr[c_or], 4),
-                    ci_str(rr[c_l95], rr[c_u95])
-                )
+            sub = ivw_df[[c_snp_ivw, c_or, c_l95, c_u95]].dropna()
+            keys = sub[c_snp_ivw].astype(str).tolist()
+            or_map = dict(zip(keys, fmt_float_col(sub[c_or], 4).tolist()))
+            ci_map = dict(zip(keys, ci_str_col(sub[c_l95], sub[c_u95]).tolist()))
 
-    if not (c_id and c_bx and c_by):
+    if not (c_id and c["bx"] and c["by"]):
         rows.append(
             "<tr><td colspan='18' style='text-align:center;color:#a00'>"
             "harmonised_data.csv is present but missing required columns to build the SNP table."
@@ -282,50 +386,34 @@ def snp_rows_from_harmonised(harm_df, ivw_df):
         )
         return rows
 
-    for _, r in harm_df.iterrows():
-        snp_raw = r[c_id]
-        snp_key = norm_id(snp_raw)
-        snp = str(snp_raw)
-
-        CHR = r[c_chr] if c_chr else DASH
-        BP  = r[c_bp]  if c_bp  else DASH
-
-        EAx = r[c_ea_x] if c_ea_x else DASH
-        OAx = r[c_oa_x] if c_oa_x else DASH
-        EAy = r[c_ea_y] if c_ea_y else DASH
-        OAy = r[c_oa_y] if c_oa_y else DASH
-
-        bx  = fmt_float(r[c_bx], 6) if c_bx else DASH
-        sx  = fmt_float(r[c_sx], 6) if c_sx else DASH
-        px  = fmt_p(r[c_px])        if c_px else DASH
+    n = len(harm_df)
 
-        by  = fmt_float(r[c_by], 6) if c_by else DASH
-        sy  = fmt_float(r[c_sy], 6) if c_sy else DASH
-        py  = fmt_p(r[c_py])        if c_py else DASH
+    def raw(c):      return escape_col(harm_df[c]) if c else [DASH] * n
+    def num(c, d):   return fmt_float_col(harm_df[c], d) if c else [DASH] * n
+    def pval(c):     return fmt_p_col(harm_df[c]) if c else [DASH] * n
 
-        eafx = fmt_float(r[c_eafx], 4) if c_eafx else DASH
-        eafy = fmt_float(r[c_eafy], 4) if c_eafy else DASH
+    snp = harm_df[c_id].astype(str)
+    snp_key = norm_id_col(snp)
 
-        # IVW OR + CI (if available)
-        or_val, or_ci = or_map.get(snp, (DASH, DASH))
+    # IVW OR + CI (if available)
+    or_val = snp.map(or_map).fillna(DASH).to_numpy()
+    or_ci  = snp.map(ci_map).fillna(DASH).to_numpy()
 
-        # F-stat from map (ld_pruned preferred; else computed)
-        f_val = f_map.get(snp_key)
-        f_val_fmt = fmt_float(f_val, 1) if f_val is not None else DASH
+    # F-stat from map (ld_pruned preferred; else computed)
+    f_val = fmt_float_col(snp_key.map(f_map), 1)
 
-        rows.append(
-            "<tr>"
-            f"<td>{snp}</td>"
-            f"<td>{CHR}</td><td>{BP}</td>"
-            f"<td>{EAx}</td><td>{OAx}</td><td>{EAy}</td><td>{OAy}</td>"
-            f"<td>{bx}</td><td>{sx}</td><td>{px}</td>"
-            f"<td>{by}</td><td>{sy}</td><td>{py}</td>"
-            f"<td>{eafx}</td><td>{eafy}</td>"
-            f"<td>{f_val_fmt}</td>"
-            f"<td>{or_val}</td><td>{or_ci}</td>"
-            "</tr>"
-        )
-    return rows
+    cells = zip(
+        escape_col(snp),
+        raw(c["chr"]), raw(c["bp"]),
+        raw(c["ea_x"]), raw(c["oa_x"]), raw(c["ea_y"]), raw(c["oa_y"]),
+        num(c["bx"], 6), num(c["sx"], 6), pval(c["px"]),
+        num(c["by"], 6), num(c["sy"], 6), pval(c["py"]),
+        num(c["eafx"], 4), num(c["eafy"], 4),
+        f_val,
+        or_val, or_ci,
+    )
+    # rows are produced lazily, as write_rows streams them into the report
+    return ("<tr><td>" + "</td><td>".join(r) + "</td></tr>" for r in cells)
 
 if not harm.empty:
     snp_rows_html = snp_rows_from_harmonised(harm, snps_ivw)
@@ -381,22 +469,25 @@ if not presso_summary.empty:
     PRESSO_DELTA_f  = (fmt_float(delta, 3) if delta is not None and not _is_na(delta) else DASH)
 
 # Outliers table rows
-presso_outlier_rows = []
 if not presso_outliers.empty and pick_ci(presso_outliers, "SNP"):
     c_snp = pick_ci(presso_outliers, "SNP")
     c_rss = pick_ci(presso_outliers, "RSSobs", "RSS_obs", "rssobs")
     c_p   = pick_ci(presso_outliers, "p_value", "p", "P")
-    for _, r in presso_outliers.iterrows():
-        snp = r.get(c_snp, "")
-        rss = fmt_float(r.get(c_rss), 3) if c_rss else DASH
-        pv  = fmt_p(r.get(c_p)) if c_p else DASH
-        presso_outlier_rows.append(f"<tr><td>{snp}</td><td class='num'>{rss}</td><td class='num'>{pv}</td></tr>")
+    n_out_rows = len(presso_outliers)
+    rss_vals = fmt_float_col(presso_outliers[c_rss], 3) if c_rss else [DASH] * n_out_rows
+    p_vals   = fmt_p_col(presso_outliers[c_p])          if c_p   else [DASH] * n_out_rows
+    presso_outlier_rows = [
+        f"<tr><td>{snp}</td><td class='num'>{rss}</td><td class='num'>{pv}</td></tr>"
+        for snp, rss, pv in zip(escape_col(presso_outliers[c_snp]), rss_vals, p_vals)
+    ]
 else:
-    presso_outlier_rows.append(
+    presso_outlier_rows = [
         "<tr><td colspan='3' style='text-align:center;color:#777'>No outliers detected</td></tr>"
-    )
+    ]
 
 # ----------------------------- Template injection -----------------------------
+PLACEHOLDER_RE = re.compile(r"<!-- [A-Z0-9_]+ -->")
+
 with open(html_template, "r", encoding="utf-8") as f:
     html = f.read()
 
@@ -424,9 +515,6 @@ repls = {
     "<!-- EGGER_I2 -->":          EG_I2_f,
     "<!-- EGGER_INT_P -->":       EG_INT_P_f,
 
-    "<!-- SNP_TABLE_ROWS -->":    "\n".join(snp_rows_html),
-    "<!-- METHOD_TABLE_ROWS -->": "\n".join(method_rows),
-
     # Static figures (existing)
     "<!-- SCATTER_COMBINED_SRC -->":   "MR_Scatter_Combined.png",
     "<!-- LOO_SRC -->":                "MR_LeaveOneOut.png",
@@ -448,14 +536,34 @@ repls = {
     "<!-- PRESSO_IVW_CI -->":   PRESSO_IVW_CI_f,
     "<!-- PRESSO_IVW_P -->":    PRESSO_IVW_P_f,
     "<!-- PRESSO_DELTA -->":    PRESSO_DELTA_f,
-    "<!-- PRESSO_OUTLIER_ROWS -->": "\n".join(presso_outlier_rows),
     "<!-- PRESSO_PLOT_SRC -->": "mr_presso_outlier_plot.png",
 }
 
-for k, v in repls.items():
-    html = html.replace(k, v)
+# Table bodies are written row by row instead of being joined into the page
+row_blocks = {
+    "<!-- SNP_TABLE_ROWS -->":       snp_rows_html,
+    "<!-- METHOD_TABLE_ROWS -->":    method_rows,
+    "<!-- PRESSO_OUTLIER_ROWS -->":  presso_outlier_rows,
+}
+
+def write_rows(f, rows):
+    """Same output as f.write("\n".join(rows)), without building the joined string."""
+    for i, r in enumerate(rows):
+        if i:
+            f.write("\n")
+        f.write(r)
 
+# One pass over the template, streamed to the output; markers without a value are left as they are
 with open(output_html, "w", encoding="utf-8") as f:
-    f.write(html)
+    pos = 0
+    for m in PLACEHOLDER_RE.finditer(html):
+        f.write(html[pos:m.start()])
+        key = m.group(0)
+        if key in row_blocks:
+            write_rows(f, row_blocks[key])
+        else:
+            f.write(repls.get(key, key))
+        pos = m.end()
+    f.write(html[pos:])
 
 print(f"✅ Report created: {output_html}")
@@ -43,29 +43,31 @@ print(outcome.isna().sum())
 # ================================ #
 # --- Manhattan Plot: Exposure --- #
 # ================================ #
-df = exposure[["BP", "PVALUE", "CHR"]].copy()
-df["-log10(PVALUE)"] = -np.log10(df["PVALUE"])
-
 plt.figure(figsize=(16, 8), dpi=300)
-chromosomes = sorted(df["CHR"].unique())
-colors = ["#1f77b4", "#d62728"] * (len(chromosomes) // 2 + 1)
+grouped = exposure.groupby("CHR", sort=True)
+chrom_rows = grouped.indices
+bp_ranges = grouped["BP"].agg(["min", "max"]).to_dict("index")
+bp = exposure["BP"].to_numpy()
+neg_log_p = -np.log10(exposure["PVALUE"].to_numpy())
+colors = ["#1f77b4", "#d62728"] * (len(chrom_rows) // 2 + 1)
 x_labels = []
 x_ticks = []
 x_offset = 0
 
-for i, chrom in enumerate(chromosomes):
-    subset = df[df["CHR"] == chrom]
+for i, (chrom, rows) in enumerate(chrom_rows.items()):
     plt.scatter(
-        subset["BP"] + x_offset,
-        subset["-log10(PVALUE)"],
+        bp[rows] + x_offset,
+        neg_log_p[rows],
         color=colors[i % 2],
         s=10,
         alpha=0.75,
-        edgecolors="none"
+        edgecolors="none",
+        rasterized=True
     )
     x_labels.append(chrom)
-    x_ticks.append(x_offset + (subset["BP"].max() - subset["BP"].min()) / 2)
-    x_offset += subset["BP"].max() - subset["BP"].min() + 1
+    bp_span = bp_ranges[chrom]["max"] - bp_ranges[chrom]["min"]
+    x_ticks.append(x_offset + bp_span / 2)
+    x_offset += bp_span + 1
 
 plt.axhline(y=-np.log10(5e-8), color="black", linestyle="dashed", linewidth=1.5,
             label="Genome-wide significance (5e-8)")
@@ -85,29 +87,31 @@ print("[INFO] Saved: exposure_manhattan.png")
 # =============================== #
 # --- Manhattan Plot: Outcome --- #
 # =============================== #
-df2 = outcome[["BP", "PVALUE", "CHR"]].copy()
-df2["-log10(PVALUE)"] = -np.log10(df2["PVALUE"])
-
 plt.figure(figsize=(16, 8), dpi=300)
-chromosomes = sorted(df2["CHR"].unique())
-colors = ["#1f77b4", "#d62728"] * (len(chromosomes) // 2 + 1)
+grouped = outcome.groupby("CHR", sort=True)
+chrom_rows = grouped.indices
+bp_ranges = grouped["BP"].agg(["min", "max"]).to_dict("index")
+bp = outcome["BP"].to_numpy()
+neg_log_p = -np.log10(outcome["PVALUE"].to_numpy())
+colors = ["#1f77b4", "#d62728"] * (len(chrom_rows) // 2 + 1)
 x_labels = []
 x_ticks = []
 x_offset = 0
 
-for i, chrom in enumerate(chromosomes):
-    subset = df2[df2["CHR"] == chrom]
+for i, (chrom, rows) in enumerate(chrom_rows.items()):
     plt.scatter(
-        subset["BP"] + x_offset,
-        subset["-log10(PVALUE)"],
+        bp[rows] + x_offset,
+        neg_log_p[rows],
         color=colors[i % 2],
         s=10,
         alpha=0.75,
-        edgecolors="none"
+        edgecolors="none",
+        rasterized=True
     )
     x_labels.append(chrom)
-    x_ticks.append(x_offset + (subset["BP"].max() - subset["BP"].min()) / 2)
-    x_offset += subset["BP"].max() - subset["BP"].min() + 1
+    bp_span = bp_ranges[chrom]["max"] - bp_ranges[chrom]["min"]
+    x_ticks.append(x_offset + bp_span / 2)
+    x_offset += bp_span + 1
 
 plt.axhline(y=-np.log10(5e-8), color="black", linestyle="dashed", linewidth=1.5,
             label="Genome-wide significance (5e-8)")
@@ -1,3 +1,4 @@
+import io
 import os
 import csv
 import pandas as pd
@@ -9,25 +10,59 @@ def read_file(location):
     with open(os.path.expanduser(location), "r") as file:
         return pd.read_csv(file, sep=",")
 
+IO_BUFFER = 8 << 20  # 8 MiB read/write buffers for multi-GB VCFs
+
 # Function to Convert VCF to CSV
 def vcf_to_csv(vcf_file_path, csv_file_path):
     data = []  # Initialize data to avoid unbound local variable error
+    last = None
+
+    # Rows that need CSV quoting go through csv.writer; the rest are converted as bytes
+    quoted = io.StringIO()
+    csv_writer = csv.writer(quoted)
 
-    with open(vcf_file_path, "r") as vcf_file:
-        with open(csv_file_path, "w", newline="") as csv_file:
-            csv_writer = csv.writer(csv_file)
+    with open(vcf_file_path, "rb", buffering=IO_BUFFER) as vcf_file:
+        with open(csv_file_path, "wb", buffering=IO_BUFFER) as csv_file:
             for line in vcf_file:
-                if line.startswith("##"):
+                if line.startswith(b"##"):
                     continue
-                elif line.startswith("#"):
-                    header = line.strip("#").strip().split("\t")
-                    csv_writer.writerow(header)
+                elif line.startswith(b"#"):
+                    fields = line.strip(b"#").strip()
                 else:
-                    data = line.strip().split("\t")
-                    csv_writer.writerow(data)
+                    fields = last = line.strip()
+
+                if not fields or b"," in fields or b'"' in fields or b"\r" in fields:
+                    csv_writer.writerow(fields.decode().split("\t"))
+                    csv_file.write(quoted.getvalue().encode())
+                    quoted.seek(0)
+                    quoted.truncate()
+                else:
+                    csv_file.write(fields.replace(b"\t", b",") + b"\r\n")
+
+    if last is not None:
+        data = last.decode().split("\t")
 
     return data if data else None  # Ensure it returns something, even if empty
 
+STAT_FIELDS = ["Beta", "SE", "LP", "AF", "ID"]
+
+# Split the ES:SE:LP:AF:ID sample field into typed stats columns
+def split_stats(df, column_name):
+    stats = df[column_name].str.split(":", expand=True)
+    stats.columns = STAT_FIELDS
+
+    # Convert to numeric
+    for field in ("Beta", "SE", "LP"):
+        stats[field] = pd.to_numeric(stats[field], errors="coerce")
+
+    # Compute p-value on the float array (also fine when LP parses as integers)
+    stats["P_VALUE"] = np.power(10.0, -stats["LP"].to_numpy(dtype=np.float64))
+
+    # Add SNP id and Position
+    stats["SNP"] = df["ID"]
+    stats["POS"] = df["POS"]
+    return stats
+
 # Correct file paths
 exposure_vcf_path = "~/cpep_MR/Data/exposure.vcf"
 exposure_csv_path = "~/cpep_MR/Data/exposure.csv"
@@ -47,39 +82,11 @@ outcome = read_file("~/cpep_MR/Cleaned Data/cleaned_outcome.csv")
 column_name = "ieu-b-5067"
 
 # ==== Exposure Formatting ==== #
-df1 = exposure[column_name].str.split(":", expand=True)
-df1.columns = ["Beta", "SE", "LP", "AF", "ID"]
-
-# Convert to numeric
-df1["Beta"] = pd.to_numeric(df1["Beta"], errors="coerce")
-df1["SE"] = pd.to_numeric(df1["SE"], errors="coerce")
-df1["LP"] = pd.to_numeric(df1["LP"], errors="coerce")
-
-# Compute p-value
-df1["P_VALUE"] = 10 ** (-df1["LP"])
-
-# Add SNP id and Position
-df1["SNP"] = exposure["ID"]
-df1["POS"] = exposure["POS"]  
-
+df1 = split_stats(exposure, column_name)
 print(df1.head(n=5), f"Shape: {df1.shape}")
 
 # ==== Outcome Formatting ==== #
-df2 = outcome[column_name].str.split(":", expand=True)
-df2.columns = ["Beta", "SE", "LP", "AF", "ID"]
-
-# Convert to numeric
-df2["Beta"] = pd.to_numeric(df2["Beta"], errors="coerce")
-df2["SE"] = pd.to_numeric(df2["SE"], errors="coerce")
-df2["LP"] = pd.to_numeric(df2["LP"], errors="coerce")
-
-# Compute p-value
-df2["P_VALUE"] = 10 ** (-df2["LP"])
-
-# Add SNP id and Position
-df2["SNP"] = outcome["ID"]
-df2["POS"] = outcome["POS"]
-
+df2 = split_stats(outcome, column_name)
 print(df2.head(n=5), f"Shape: {df2.shape}")
 
 # Save updated DataFrames
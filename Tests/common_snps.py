@@ -3,9 +3,21 @@
 import os
 import pandas as pd
 
+# Optional, multi-threaded TSV parsing
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
 def read_tsv(location):
-    with open(os.path.expanduser(location), "r") as file:
-        return pd.read_csv(location, sep="\t")
+    path = os.path.expanduser(location)
+    if _HAS_PYARROW:
+        try:
+            return pd.read_csv(path, sep="\t", engine="pyarrow")
+        except Exception:
+            pass  # fall back to the C parser
+    return pd.read_csv(path, sep="\t")
 
 def parse_csv(location):
     with open(os.path.expanduser(location), "r") as file: